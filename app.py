@@ -12,9 +12,17 @@ import time
 import subprocess
 import json
 import re
-from typing import List, Optional
-import whisper
-from pyannote.audio import Pipeline
+from typing import Optional
+import numpy as np
+import soundfile as sf
+import torch
+import torchaudio
+from yt_dlp import YoutubeDL
+from yt_dlp.utils import DownloadError, download_range_func
+
+from app.audio_processor import load_audio
+from app.diarizer import run_diarization, single_speaker_segments
+from app.transcriber import WhisperTranscriber
 
 # Set page configuration
 st.set_page_config(
@@ -68,128 +76,86 @@ class TimeRange:
         self.end_time = end_time
         self.id = id
 
-# Cache the diarization pipeline so it loads only once per session.
-@st.cache_resource
-def get_diarization_pipeline():
-    token = os.environ.get("HUGGINGFACE_TOKEN")
-    if token is None:
-        st.error("HUGGINGFACE_TOKEN environment variable is not set.")
-        return None
+# Audio processing functions
+def probe_audio(input_file):
+    """Return codec_name, sample_rate and channels of the first audio stream, or None."""
+    command = [
+        "ffprobe", "-v", "error",
+        "-select_streams", "a:0",
+        "-show_entries", "stream=codec_name,sample_rate,channels",
+        "-of", "json",
+        input_file
+    ]
     try:
-        pipeline = Pipeline.from_pretrained("pyannote/speaker-diarization-3.1", use_auth_token=token)
-        return pipeline
-    except Exception as e:
-        st.error(f"Error loading diarization pipeline: {e}")
+        result = subprocess.run(command, check=True, text=True, capture_output=True)
+        streams = json.loads(result.stdout).get("streams", [])
+    except (subprocess.CalledProcessError, json.JSONDecodeError, OSError):
         return None
+    return streams[0] if streams else None
 
-# Audio processing functions
-def seconds_to_hms(seconds: float) -> str:
-    """Convert seconds (float) to HH:MM:SS.sss format."""
-    hours = int(seconds // 3600)
-    minutes = int((seconds % 3600) // 60)
-    secs = seconds - (hours * 3600 + minutes * 60)
-    return f"{hours:02d}:{minutes:02d}:{secs:06.3f}"
-
-def hms_to_seconds(hms: str) -> float:
-    """Convert HH:MM:SS or HH:MM:SS.sss format to seconds."""
-    if '.' in hms:
-        time_part, ms_part = hms.split('.')
-        ms = float(f"0.{ms_part}")
-    else:
-        time_part = hms
-        ms = 0.0
-    parts = time_part.split(':')
-    if len(parts) == 3:
-        h, m, s = parts
-        seconds = int(h) * 3600 + int(m) * 60 + int(s) + ms
-    elif len(parts) == 2:
-        m, s = parts
-        seconds = int(m) * 60 + int(s) + ms
-    else:
-        seconds = int(parts[0]) + ms
-    return seconds
+def is_soundfile_readable(info) -> bool:
+    """True if the probed stream is uncompressed PCM or FLAC, which soundfile reads directly."""
+    return info is not None and (info.get("codec_name", "").startswith("pcm_") or info.get("codec_name") == "flac")
 
-def run_command(command: List[str]) -> subprocess.CompletedProcess:
-    """Run a shell command and return its result."""
-    return subprocess.run(command, check=True, text=True, capture_output=True)
+def to_whisper_samples(samples, sample_rate):
+    """Downmix to mono and resample to 16 kHz, in memory."""
+    if samples.ndim == 2:
+        samples = samples.mean(axis=1, dtype=np.float32)
+    if sample_rate != 16000:
+        samples = torchaudio.functional.resample(torch.from_numpy(samples), sample_rate, 16000).numpy()
+    return samples
 
-def create_temp_file(uploaded_file):
-    """Create a temporary file from an uploaded file."""
-    temp_dir = tempfile.mkdtemp()
+def create_temp_file(uploaded_file, temp_dir):
+    """Write an uploaded file into temp_dir and return its path."""
     temp_path = os.path.join(temp_dir, uploaded_file.name)
     with open(temp_path, "wb") as f:
         f.write(uploaded_file.getbuffer())
     return temp_path
 
-def trim_audio(input_file, start_time, end_time, output_file):
-    """Trim audio using ffmpeg and re-encode to 16 kHz mono WAV."""
-    command = [
-        "ffmpeg", "-y",
-        "-i", input_file,
-        "-ss", start_time
-    ]
-    if end_time:
-        command.extend(["-to", end_time])
-    command.extend([
-        "-vn",
-        "-acodec", "pcm_s16le",
-        "-ar", "16000",
-        "-ac", "1",
-        output_file
-    ])
-    try:
-        run_command(command)
-        return output_file
-    except subprocess.CalledProcessError as e:
-        st.error(f"Error trimming audio: {e.stderr}")
-        return None
+def time_to_seconds(time_str):
+    """Convert HH:MM:SS(.sss) or MM:SS(.sss) to seconds."""
+    seconds = 0.0
+    for part in time_str.split(":"):
+        seconds = seconds * 60 + float(part)
+    return seconds
 
-def download_youtube_audio(url, output_file):
-    """Download audio from YouTube using yt-dlp."""
-    command = [
-        "yt-dlp",
-        "-f", "bestaudio",
-        "--extract-audio",
-        "--audio-format", "wav",
-        "-o", output_file,
-        url,
-    ]
+def download_youtube_audio(url, output_file, start_time=None, end_time=None):
+    """
+    Download audio from YouTube as WAV using the in-process yt-dlp API.
+    If a start or end time is given, only that section is downloaded.
+    """
+    options = {
+        "format": "bestaudio",
+        # yt-dlp picks the download's extension; the post-processor renames it to .wav.
+        "outtmpl": os.path.splitext(output_file)[0] + ".%(ext)s",
+        "postprocessors": [{"key": "FFmpegExtractAudio", "preferredcodec": "wav"}],
+        "quiet": True,
+        "noprogress": True,
+    }
+    if start_time or end_time:
+        start = time_to_seconds(start_time) if start_time else 0
+        end = time_to_seconds(end_time) if end_time else float("inf")
+        options["download_ranges"] = download_range_func(None, [(start, end)])
     try:
-        run_command(command)
+        with YoutubeDL(options) as ydl:
+            ydl.download([url])
         return output_file
-    except subprocess.CalledProcessError as e:
-        st.error(f"Error downloading audio: {e.stderr}")
+    except DownloadError as e:
+        st.error(f"Error downloading audio: {e}")
         return None
 
-def run_diarization(audio_file):
+def merge_segments(segments, max_gap=0.5):
     """
-    Run speaker diarization on the given audio file using pyannote.audio.
+    Merge consecutive segments of the same speaker separated by less than max_gap seconds,
+    so Whisper sees fewer, longer clips instead of many short turns.
     """
-    pipeline = get_diarization_pipeline()
-    if pipeline is None:
-        return []
-    try:
-        diarization = pipeline(audio_file)
-        segments = []
-        for turn, _, speaker in diarization.itertracks(yield_label=True):
-            segments.append({
-                "start": turn.start,
-                "end": turn.end,
-                "speaker": speaker
-            })
-        return segments
-    except Exception as e:
-        st.error(f"Error during diarization: {str(e)}")
-        return []
-
-class WhisperTranscriber:
-    def __init__(self, model_name="base"):
-        self.model = whisper.load_model(model_name)
-    
-    def transcribe(self, audio_file):
-        """Transcribe an audio file using Whisper."""
-        result = self.model.transcribe(audio_file)
-        return result["text"].strip()
+    merged = []
+    for segment in segments:
+        if merged and merged[-1]["speaker"] == segment["speaker"] and segment["start"] - merged[-1]["end"] < max_gap:
+            merged[-1]["end"] = max(merged[-1]["end"], segment["end"])
+        else:
+            merged.append(dict(segment))
+    return merged
 
 def display_header():
     """Display the header with title and description."""
@@ -200,9 +166,10 @@ def display_header():
         st.title("Audio Transcription & Speaker Diarization")
         st.markdown("Process audio files or YouTube videos to get transcriptions with speaker identification.")
 
-def get_whisper_models():
-    """Return available Whisper models."""
-    return ["tiny", "base", "small", "medium", "large"]
+# Available Whisper models.
+WHISPER_MODELS = ("tiny", "base", "small", "medium", "large")
+
+SPEAKER_COLORS = ("#FF9AA2", "#FFDAC1","#FFB7B2", "#E2F0CB", "#B5EAD7", "#C7CEEA")
 
 def display_transcription(transcriptions):
     """Display transcription results with speaker labels."""
@@ -210,60 +177,95 @@ def display_transcription(transcriptions):
         st.warning("No transcription results available.")
         return
     st.subheader("Transcription Results")
-    with st.container():
-        st.markdown('<div class="output-container">', unsafe_allow_html=True)
-        speakers = list(set(t["speaker"] for t in transcriptions))
-        colors = ["#FF9AA2", "#FFDAC1","#FFB7B2", "#E2F0CB", "#B5EAD7", "#C7CEEA"]
-        speaker_colors = {speakers[i]: colors[i % len(colors)] for i in range(len(speakers))}
-        for segment in transcriptions:
-            speaker = segment["speaker"]
-            text = segment["text"]
-            start_time = segment["start"]
-            end_time = segment["end"]
-            timestamp = f"{start_time:.2f}s - {end_time:.2f}s"
-            speaker_html = f'<span class="speaker-label" style="background-color: {speaker_colors[speaker]};">{speaker}</span>'
-            st.markdown(f'{speaker_html} <small>({timestamp})</small> {text}', unsafe_allow_html=True)
-        st.markdown('</div>', unsafe_allow_html=True)
+    # Colors are assigned in order of first appearance, so they're stable across reruns.
+    speaker_colors = {}
+    lines = []
+    for segment in transcriptions:
+        speaker = segment["speaker"]
+        color = speaker_colors.setdefault(speaker, SPEAKER_COLORS[len(speaker_colors) % len(SPEAKER_COLORS)])
+        timestamp = f"{segment['start']:.2f}s - {segment['end']:.2f}s"
+        speaker_html = f'<span class="speaker-label" style="background-color: {color};">{speaker}</span>'
+        lines.append(f'{speaker_html} <small>({timestamp})</small> {segment["text"]}')
+    # Render everything in one element instead of one Streamlit call per segment.
+    st.markdown(
+        '<div class="output-container">' + "<br>".join(lines) + '</div>',
+        unsafe_allow_html=True
+    )
 
-def process_audio(file_path, start_time, end_time, whisper_model="base"):
-    """Process an audio file: trim, diarize, segment, and transcribe."""
-    temp_dir = tempfile.mkdtemp()
-    trimmed_path = os.path.join(temp_dir, "trimmed_audio.wav")
-    trimmed_file = trim_audio(file_path, start_time, end_time, trimmed_path)
-    if not trimmed_file:
+def load_audio_range(file_path, start_time, end_time):
+    """
+    Return (samples, sample_rate) of the requested range as 16 kHz mono float32,
+    or (None, None) on error. PCM and FLAC files are sliced directly with
+    soundfile, then downmixed and resampled in memory; anything else is
+    decoded by ffmpeg straight into memory.
+    """
+    info = probe_audio(file_path)
+    if is_soundfile_readable(info):
+        sample_rate = int(info["sample_rate"])
+        start = int(time_to_seconds(start_time) * sample_rate)
+        stop = int(time_to_seconds(end_time) * sample_rate) if end_time else None
+        try:
+            samples, sample_rate = sf.read(file_path, start=start, stop=stop, dtype="float32")
+            return to_whisper_samples(samples, sample_rate), 16000
+        except RuntimeError:
+            pass  # e.g. PCM in a container libsndfile can't read; let ffmpeg handle it
+    samples = load_audio(file_path, start_time, end_time)
+    if samples is None:
+        return None, None
+    return samples, 16000
+
+@st.cache_resource
+def get_transcriber(model_name):
+    """One WhisperTranscriber per model, kept across Streamlit reruns."""
+    return WhisperTranscriber(model_name=model_name)
+
+def process_audio(file_path, start_time, end_time, whisper_model="base", num_speakers=None):
+    """
+    Process an audio file: trim, diarize, segment, and transcribe.
+    num_speakers, if known, is passed to pyannote; None or 0 means auto-detect.
+    """
+    samples, sample_rate = load_audio_range(file_path, start_time, end_time)
+    if samples is None:
         return []
-    # Run real speaker diarization via pyannote.audio
-    diarization_segments = run_diarization(trimmed_file)
-    transcriber = WhisperTranscriber(whisper_model)
-    transcriptions = []
-    for i, segment in enumerate(diarization_segments):
-        seg_start = seconds_to_hms(segment["start"])
-        seg_end = seconds_to_hms(segment["end"])
-        segment_path = os.path.join(temp_dir, f"segment_{i}.wav")
-        segment_file = trim_audio(trimmed_file, seg_start, seg_end, segment_path)
-        if segment_file:
-            transcript = transcriber.transcribe(segment_file)
-            transcriptions.append({
-                "speaker": segment["speaker"],
-                "text": transcript,
-                "start": segment["start"],
-                "end": segment["end"]
-            })
-            os.remove(segment_file)
-    os.remove(trimmed_file)
+    diarization_segments = None
+    if num_speakers == 1:
+        # A single speaker is known up front: only the speech span is needed, never pyannote.
+        diarization_segments = single_speaker_segments(samples, sample_rate, min_speech=float("inf"))
+    elif not num_speakers:
+        # Only run pyannote when the VAD gate can't rule out multiple speakers.
+        diarization_segments = single_speaker_segments(samples, sample_rate)
+    if diarization_segments is None:
+        # Run real speaker diarization via pyannote.audio
+        diarization_segments = merge_segments(run_diarization({
+            "waveform": torch.from_numpy(samples).unsqueeze(0),
+            "sample_rate": sample_rate
+        }, num_speakers=num_speakers))
+    clips = [samples[int(seg["start"] * sample_rate):int(seg["end"] * sample_rate)] for seg in diarization_segments]
+    texts = get_transcriber(whisper_model).transcribe_batch(clips)
+    transcriptions = [
+        {
+            "speaker": segment["speaker"],
+            "text": transcript,
+            "start": segment["start"],
+            "end": segment["end"]
+        }
+        for segment, transcript in zip(diarization_segments, texts)
+    ]
     return transcriptions
 
+_TIME_RE = re.compile(r'^([0-9]{1,2}:)?[0-5]?[0-9]:[0-5][0-9](\.[0-9]{1,3})?$')
+
 def validate_time_format(time_str):
     """Validate time format (HH:MM:SS or MM:SS)."""
-    pattern = r'^([0-9]{1,2}:)?[0-5]?[0-9]:[0-5][0-9](\.[0-9]{1,3})?$'
-    return re.match(pattern, time_str) is not None
+    return _TIME_RE.match(time_str) is not None
 
 def main():
     display_header()
     # Create tabs for audio file upload and YouTube URL
     tab1, tab2 = st.tabs(["📁 Upload Audio", "🎥 YouTube URL"])
     st.sidebar.header("Configuration")
-    whisper_model = st.sidebar.selectbox("Whisper Model", get_whisper_models(), index=1)
+    whisper_model = st.sidebar.selectbox("Whisper Model", WHISPER_MODELS, index=1)
+    num_speakers = st.sidebar.number_input("Speakers (0 = auto)", min_value=0, max_value=10, value=0)
     
     # Upload Audio tab
     with tab1:
@@ -285,9 +287,10 @@ def main():
                 if end_time and not validate_time_format(end_time):
                     st.error("Invalid end time format. Use HH:MM:SS or MM:SS.")
                     return
-                with st.spinner("Processing audio..."):
-                    temp_path = create_temp_file(uploaded_file)
-                    transcriptions = process_audio(temp_path, start_time, end_time, whisper_model)
+                # One temporary directory per request, removed when processing is done.
+                with st.spinner("Processing audio..."), tempfile.TemporaryDirectory() as work_dir:
+                    temp_path = create_temp_file(uploaded_file, work_dir)
+                    transcriptions = process_audio(temp_path, start_time, end_time, whisper_model, num_speakers=num_speakers)
                     display_transcription(transcriptions)
                     if transcriptions:
                         download_text = "\n\n".join([
@@ -325,12 +328,12 @@ def main():
                 if not youtube_url.startswith("https://"):
                     st.error("Please enter a valid YouTube URL.")
                     return
-                with st.spinner("Downloading and processing video..."):
-                    temp_dir = tempfile.mkdtemp()
-                    output_file = os.path.join(temp_dir, "youtube_audio.wav")
-                    audio_file = download_youtube_audio(youtube_url, output_file)
+                with st.spinner("Downloading and processing video..."), tempfile.TemporaryDirectory() as work_dir:
+                    output_file = os.path.join(work_dir, "youtube_audio.wav")
+                    # Only the requested section is downloaded, so the file already starts at start_time.
+                    audio_file = download_youtube_audio(youtube_url, output_file, start_time, end_time)
                     if audio_file:
-                        transcriptions = process_audio(audio_file, start_time, end_time, whisper_model)
+                        transcriptions = process_audio(audio_file, "00:00:00", None, whisper_model, num_speakers=num_speakers)
                         display_transcription(transcriptions)
                         if transcriptions:
                             download_text = "\n\n".join([
@@ -343,8 +346,6 @@ def main():
                                 file_name=f"youtube_transcription_{int(time.time())}.txt",
                                 mime="text/plain"
                             )
-                    if os.path.exists(audio_file):
-                        os.remove(audio_file)
 
 if __name__ == "__main__":
     main()
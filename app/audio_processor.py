@@ -2,15 +2,25 @@
 import os
 import subprocess
 import tempfile
+from collections import deque
 from typing import List, Optional
+import numpy as np
 import streamlit as st
 
 def run_command(command: List[str]) -> subprocess.CompletedProcess:
     """
     Run a shell command and return its result.
+    stdout is discarded and only the last 200 stderr lines are kept (for error
+    reporting), so long ffmpeg logs aren't buffered in memory.
     Raises CalledProcessError if it fails.
     """
-    return subprocess.run(command, check=True, text=True, capture_output=True)
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    tail = deque(process.stderr, maxlen=200)
+    returncode = process.wait()
+    stderr = "".join(tail)
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, command, output="", stderr=stderr)
+    return subprocess.CompletedProcess(command, returncode, stdout="", stderr=stderr)
 
 def create_temp_file(uploaded_file):
     """
@@ -23,13 +33,41 @@ def create_temp_file(uploaded_file):
         f.write(uploaded_file.getbuffer())
     return temp_path
 
+def load_audio(input_file: str, start_time: str, end_time: Optional[str]) -> Optional[np.ndarray]:
+    """
+    Decode the given time range of input_file to 16 kHz mono float32 samples.
+    ffmpeg streams raw PCM over a pipe, so no trimmed file is written.
+    Returns None on error.
+    """
+    command = [
+        "ffmpeg", "-y", "-loglevel", "error", "-nostats",
+        "-i", input_file,
+        "-ss", start_time
+    ]
+    if end_time:
+        command.extend(["-to", end_time])
+    command.extend([
+        "-vn",
+        "-f", "s16le",           # raw 16-bit PCM on stdout
+        "-acodec", "pcm_s16le",
+        "-ar", "16000",
+        "-ac", "1",
+        "pipe:1"
+    ])
+    try:
+        result = subprocess.run(command, check=True, capture_output=True)
+    except subprocess.CalledProcessError as e:
+        st.error(f"Error trimming audio: {e.stderr.decode(errors='replace')}")
+        return None
+    return np.frombuffer(result.stdout, dtype=np.int16).astype(np.float32) / 32768.0
+
 def trim_audio(input_file: str, start_time: str, end_time: Optional[str], output_file: str) -> Optional[str]:
     """
     Trim audio using ffmpeg and re-encode to 16 kHz mono WAV.
     Returns the path to the trimmed file or None on error.
     """
     command = [
-        "ffmpeg", "-y",
+        "ffmpeg", "-y", "-loglevel", "error", "-nostats",
         "-i", input_file,
         "-ss", start_time
     ]
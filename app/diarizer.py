@@ -1,38 +1,54 @@
 # diarizer.py
-import os
+from typing import Dict, List, Optional, Union
+import numpy as np
 import streamlit as st
-from pyannote.audio import Pipeline
+import torch
+from pyannote.audio import Audio
+from app.models import DEVICE, diarization_pipeline, vad_model
+
+# Decodes, resamples and downmixes input files the way the pipeline expects.
+AUDIO = Audio(sample_rate=16000, mono="downmix")
 
-@st.cache_resource
 def get_diarization_pipeline():
     """
-    Cache the pyannote pipeline so it's loaded only once.
+    Return the shared pyannote pipeline, loaded only once per process.
     Requires HUGGINGFACE_TOKEN environment variable.
     """
-    token = os.environ.get("HUGGINGFACE_TOKEN")
-    if token is None:
-        st.error("HUGGINGFACE_TOKEN environment variable is not set.")
-        return None
     try:
-        pipeline = Pipeline.from_pretrained(
-            "pyannote/speaker-diarization-3.1",
-            use_auth_token=token
-        )
-        return pipeline
+        return diarization_pipeline()
     except Exception as e:
         st.error(f"Error loading diarization pipeline: {e}")
         return None
 
-def run_diarization(audio_file: str):
+def run_diarization(
+    audio: Union[str, Dict], embedding_batch_size: int = 8, segmentation_batch_size: int = 8,
+    num_speakers: Optional[int] = None
+):
     """
-    Run speaker diarization on the given audio file.
+    Run speaker diarization on an audio file, or on an in-memory
+    {"waveform": (channel, time) tensor, "sample_rate": int} dict.
+    A known num_speakers lets pyannote skip estimating the speaker count.
+    Small batch sizes keep pyannote's working set in GPU memory on consumer
+    cards; the defaults (32) can spill and run many times slower.
     Returns a list of dicts with {start, end, speaker}.
     """
     pipeline = get_diarization_pipeline()
     if pipeline is None:
         return []
     try:
-        diarization = pipeline(audio_file)
+        pipeline.embedding_batch_size = embedding_batch_size
+        pipeline.segmentation_batch_size = segmentation_batch_size
+        # Hand pyannote a decoded waveform already on the pipeline's device,
+        # rather than a path it would decode on the CPU itself.
+        if isinstance(audio, dict):
+            waveform, sample_rate = audio["waveform"], audio["sample_rate"]
+        else:
+            waveform, sample_rate = AUDIO(audio)
+        # On GPU, run the segmentation and embedding models in fp16 (tensor cores);
+        # on CPU, where fp16 is slower, stay in fp32.
+        with torch.inference_mode(), torch.autocast("cuda", dtype=torch.float16, enabled=DEVICE.type == "cuda"):
+            hints = {"num_speakers": num_speakers} if num_speakers else {}
+            diarization = pipeline({"waveform": waveform.to(DEVICE), "sample_rate": sample_rate}, **hints)
         segments = []
         for turn, _, speaker in diarization.itertracks(yield_label=True):
             segments.append({
@@ -44,3 +60,24 @@ def run_diarization(audio_file: str):
     except Exception as e:
         st.error(f"Error during diarization: {str(e)}")
         return []
+
+@torch.inference_mode()
+def single_speaker_segments(samples: np.ndarray, sample_rate: int, min_speech: float = 3.0) -> Optional[List[Dict]]:
+    """
+    Cheap VAD gate to run before diarization. If the audio has at most one
+    speech region, or less than min_speech seconds of speech, return it as a
+    single SPEAKER_00 segment (or [] when there is no speech at all).
+    Returns None when the audio needs full diarization.
+    """
+    model, get_speech_timestamps = vad_model()
+    regions = get_speech_timestamps(torch.from_numpy(samples), model, sampling_rate=sample_rate)
+    if not regions:
+        return []
+    total_speech = sum(r["end"] - r["start"] for r in regions) / sample_rate
+    if len(regions) > 1 and total_speech >= min_speech:
+        return None
+    return [{
+        "start": regions[0]["start"] / sample_rate,
+        "end": regions[-1]["end"] / sample_rate,
+        "speaker": "SPEAKER_00"
+    }]
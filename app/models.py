@@ -0,0 +1,67 @@
+# models.py
+import os
+from functools import lru_cache
+import torch
+import whisper
+from pyannote.audio import Pipeline
+
+DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+def quantize_linear_layers(model):
+    """Quantize a Whisper model's Linear layers to int8 for CPU inference."""
+    # quantize_dynamic matches exact module types, so swap Whisper's Linear
+    # subclass for plain nn.Linear first.
+    for module in list(model.modules()):
+        for name, child in module.named_children():
+            if isinstance(child, torch.nn.Linear) and type(child) is not torch.nn.Linear:
+                linear = torch.nn.Linear(child.in_features, child.out_features, bias=child.bias is not None)
+                linear.load_state_dict(child.state_dict())
+                setattr(module, name, linear)
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+def to_half_precision(model):
+    """
+    Store a Whisper model's weights in fp16 so attention runs through SDPA's
+    fp16 (FlashAttention) kernels without casting weights on every forward.
+    LayerNorms stay fp32, since Whisper normalizes in fp32.
+    """
+    model.half()
+    for module in model.modules():
+        if isinstance(module, torch.nn.LayerNorm):
+            module.float()
+    return model
+
+@lru_cache(maxsize=None)
+def whisper_model(model_name: str):
+    """
+    Load a Whisper model once per process and share it between callers.
+    On GPU Whisper runs in fp16; on CPU, where fp16 is slow, use int8 instead.
+    """
+    model = whisper.load_model(model_name, device=DEVICE)
+    if DEVICE.type == "cuda":
+        model = to_half_precision(model)
+    else:
+        model = quantize_linear_layers(model)
+    return model
+
+@lru_cache(maxsize=None)
+def vad_model():
+    """
+    Load the Silero VAD model once per process.
+    Returns (model, get_speech_timestamps).
+    """
+    model, utils = torch.hub.load("snakers4/silero-vad", "silero_vad")
+    return model, utils[0]
+
+@lru_cache(maxsize=None)
+def diarization_pipeline():
+    """
+    Load the pyannote pipeline once per process and share it between callers.
+    Requires HUGGINGFACE_TOKEN environment variable.
+    """
+    token = os.environ.get("HUGGINGFACE_TOKEN")
+    if token is None:
+        raise RuntimeError("HUGGINGFACE_TOKEN environment variable is not set.")
+    pipeline = Pipeline.from_pretrained("pyannote/speaker-diarization-3.1", use_auth_token=token)
+    pipeline.to(DEVICE)
+    return pipeline
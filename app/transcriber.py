@@ -1,18 +1,122 @@
 # transcriber.py
+import hashlib
+import os
+import threading
+from typing import Dict, List, Optional, Union
+import numpy as np
+import torch
 import whisper
+from app.models import DEVICE, whisper_model
+
+# Transcribers are shared across Streamlit sessions and share models with each
+# other, and whisper.decode installs kv-cache hooks on the model, so only one
+# thread may run a model (or fill a staging buffer) at a time.
+_MODEL_LOCK = threading.Lock()
 
 class WhisperTranscriber:
-    def __init__(self, model_name="base"):
+    def __init__(self, model_name="base", batch_size=16, cache_dir: Optional[str] = None):
         """
-        Load the specified Whisper model.
+        Load the specified Whisper model (shared with other transcribers).
         Model can be 'tiny', 'base', 'small', 'medium', or 'large'.
+        If cache_dir is given, transcripts of clips are cached there by audio content.
         """
-        self.model = whisper.load_model(model_name)
+        self.model = whisper_model(model_name)
+        self.model_name = model_name
+        self.batch_size = batch_size
+        # Reused host buffer for a batch of padded 30s clips; pinned on GPU so the
+        # whole batch goes to the device in one asynchronous copy.
+        self._staging = torch.zeros(batch_size, whisper.audio.N_SAMPLES, pin_memory=DEVICE.type == "cuda")
+        self.cache_dir = cache_dir
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
     
-    def transcribe(self, audio_file: str) -> str:
+    @torch.inference_mode()
+    def transcribe(self, audio_file: Union[str, np.ndarray]) -> str:
         """
-        Transcribe an audio file using Whisper.
+        Transcribe an audio file, or 16 kHz mono float32 samples, using Whisper.
         Returns the text transcript.
         """
-        result = self.model.transcribe(audio_file)
+        with _MODEL_LOCK:
+            result = self.model.transcribe(audio_file, fp16=DEVICE.type == "cuda")
         return result["text"].strip()
+
+    def transcribe_batch(self, clips: List[np.ndarray]) -> List[str]:
+        """
+        Transcribe several 16 kHz clips, returning one transcript per clip.
+        Identical clips (e.g. repeated jingles) are transcribed once, and with a
+        cache_dir, clips transcribed before are read from the cache.
+        """
+        transcripts = [""] * len(clips)
+        # Indices of each distinct clip, keyed by a hash of its samples, model and device
+        pending: Dict[str, List[int]] = {}
+        for i, clip in enumerate(clips):
+            digest = hashlib.blake2b(clip.tobytes(), digest_size=16)
+            # The model runs in fp16 on GPU and int8 on CPU, so the device is part of the key
+            digest.update(f"{self.model_name}/{DEVICE.type}".encode())
+            key = digest.hexdigest()
+            cache_file = self._cache_file(key)
+            text = self._read_cache(cache_file) if cache_file else None
+            if text is not None:
+                transcripts[i] = text
+            else:
+                pending.setdefault(key, []).append(i)
+        texts = self._transcribe_clips([clips[indices[0]] for indices in pending.values()])
+        for (key, indices), text in zip(pending.items(), texts):
+            for i in indices:
+                transcripts[i] = text
+            cache_file = self._cache_file(key)
+            if cache_file:
+                with open(cache_file, "w", encoding="utf-8") as f:
+                    f.write(text)
+        return transcripts
+
+    def _cache_file(self, key: str) -> Optional[str]:
+        return os.path.join(self.cache_dir, f"{key}.txt") if self.cache_dir else None
+
+    @staticmethod
+    def _read_cache(cache_file: str) -> Optional[str]:
+        """Return a cached transcript, or None on a miss (including a file pruned meanwhile)."""
+        try:
+            # Mark as recently used, since the cache is pruned by modification time
+            os.utime(cache_file)
+            with open(cache_file, encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _transcribe_clips(self, clips: List[np.ndarray]) -> List[str]:
+        """
+        Clips that fit in Whisper's 30s window are encoded and decoded together
+        in batches of batch_size; longer ones go through transcribe().
+        """
+        transcripts = [""] * len(clips)
+        batched = []
+        for i, clip in enumerate(clips):
+            if len(clip) > whisper.audio.N_SAMPLES:
+                transcripts[i] = self.transcribe(clip)
+            else:
+                batched.append(i)
+        for b in range(0, len(batched), self.batch_size):
+            indices = batched[b:b + self.batch_size]
+            texts = self._decode_batch([clips[i] for i in indices])
+            for i, text in zip(indices, texts):
+                transcripts[i] = text
+        return transcripts
+
+    @torch.inference_mode()
+    def _decode_batch(self, clips: List[np.ndarray]) -> List[str]:
+        """Decode up to 30s clips as one (B, n_mels, 3000) mel batch."""
+        # Held from filling the staging buffer until decoding is done, so the
+        # asynchronous copy can't pick up another thread's clips.
+        with _MODEL_LOCK:
+            audio = self._staging[:len(clips)]
+            audio.zero_()
+            for i, clip in enumerate(clips):
+                audio[i, :len(clip)] = torch.from_numpy(clip)
+            audio = audio.to(DEVICE, non_blocking=True)
+            # Spectrograms are computed per clip, on the device, so each keeps its own
+            # dynamic-range clamp; whisper caches the mel filterbank per device.
+            mels = torch.stack([whisper.log_mel_spectrogram(clip, self.model.dims.n_mels) for clip in audio])
+            options = whisper.DecodingOptions(fp16=DEVICE.type == "cuda")
+            results = whisper.decode(self.model, mels, options)
+        return [result.text.strip() for result in results]
@@ -32,26 +32,29 @@ def display_header():
         st.title("Audio Transcription & Speaker Diarization")
         st.markdown("Process audio files or YouTube videos to get transcriptions with speaker identification.")
 
+_TIME_RE = re.compile(r'^(?:[0-9]{1,2}:)?[0-5]?[0-9]:[0-5][0-9](?:\.[0-9]{1,3})?$')
+
 def validate_time_format(time_str: str) -> bool:
-    pattern = r'^([0-9]{1,2}:)?[0-5]?[0-9]:[0-5][0-9](\.[0-9]{1,3})?$'
-    return re.match(pattern, time_str) is not None
+    return bool(time_str) and _TIME_RE.match(time_str) is not None
+
+SPEAKER_COLORS = ("#FF9AA2", "#FFB7B2", "#FFDAC1", "#E2F0CB", "#B5EAD7", "#C7CEEA")
 
 def display_transcription(transcriptions):
     if not transcriptions:
         st.warning("No transcription results available.")
         return
     st.subheader("Transcription Results")
-    with st.container():
-        st.markdown('<div class="output-container">', unsafe_allow_html=True)
-        speakers = list(set(t["speaker"] for t in transcriptions))
-        colors = ["#FF9AA2", "#FFB7B2", "#FFDAC1", "#E2F0CB", "#B5EAD7", "#C7CEEA"]
-        speaker_colors = {speakers[i]: colors[i % len(colors)] for i in range(len(speakers))}
-        for segment in transcriptions:
-            speaker = segment["speaker"]
-            text = segment["text"]
-            start_time = segment["start"]
-            end_time = segment["end"]
-            timestamp = f"{start_time:.2f}s - {end_time:.2f}s"
-            speaker_html = f'<span class="speaker-label" style="background-color: {speaker_colors[speaker]};">{speaker}</span>'
-            st.markdown(f'{speaker_html} <small>({timestamp})</small> {text}', unsafe_allow_html=True)
-        st.markdown('</div>', unsafe_allow_html=True)
+    # Colors are assigned in order of first appearance, so they're stable across reruns.
+    speaker_colors = {}
+    lines = []
+    for segment in transcriptions:
+        speaker = segment["speaker"]
+        color = speaker_colors.setdefault(speaker, SPEAKER_COLORS[len(speaker_colors) % len(SPEAKER_COLORS)])
+        timestamp = f"{segment['start']:.2f}s - {segment['end']:.2f}s"
+        speaker_html = f'<span class="speaker-label" style="background-color: {color};">{speaker}</span>'
+        lines.append(f'{speaker_html} <small>({timestamp})</small> {segment["text"]}')
+    # Render everything in one element instead of one Streamlit call per segment.
+    st.markdown(
+        '<div class="output-container">' + "<br>".join(lines) + '</div>',
+        unsafe_allow_html=True
+    )
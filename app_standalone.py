@@ -12,11 +12,13 @@ class TimeRange:
 class VideoConfig:
     url: str
     time_ranges: List[TimeRange]
+    num_speakers: Optional[int] = None  # known speaker count; None lets pyannote estimate it
 
 @dataclass
 class LocalAudioConfig:
     path: str  # local path to the audio file (e.g. "path/to/file.wav")
     time_ranges: List[TimeRange]
+    num_speakers: Optional[int] = None
 
 
 @dataclass
@@ -25,39 +27,120 @@ class AppConfig:
     transcription_output_dir: str = "transcriptions"
     whisper_model: str = "base"
     audio_format: str = "wav"
+    trim_format: str = "wav"  # trimmed clips listed in the output: "wav" or "flac" (lossless, about half the size)
+    prefetch_depth: int = 2  # number of downloads running ahead of transcription
+    compile_encoder: bool = False  # torch.compile the Whisper encoder (CUDA only; needs a working Triton toolchain)
+    cache_dir: Optional[str] = ".cache"  # downloads + diarization/transcription results; None disables caching
+    merge_gap: float = 0.3  # merge same-speaker turns at most this many seconds apart
+    trim_workers: int = 4  # concurrent ffmpeg trims per source; keep low (2-4) on spinning disks
+    backend: str = "openai-whisper"  # or "faster-whisper" / "whisper.cpp" (optional dependencies)
+    fast_whisper_model: Optional[str] = None  # e.g. "tiny.en": used for segments under fast_max_duration
+    fast_max_duration: float = 6.0  # seconds (openai-whisper backend only)
+    int8: bool = False  # int8 Whisper weights (openai-whisper backend; bitsandbytes needed on CUDA)
 
 # audio_processor.py
 import os
+import hashlib
+import json
 import subprocess
-from typing import Optional
+import threading
+from typing import Dict, Optional, Tuple, Union
 import logging
 from pathlib import Path
+import numpy as np
+import soundfile as sf
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+from yt_dlp import YoutubeDL
+from yt_dlp.utils import DownloadError, download_range_func
+
 # Import the pyannote.audio pipeline for diarization
-from pyannote.audio import Pipeline
+import torch
+from pyannote.audio import Audio, Pipeline
+
+def time_to_seconds(time_str: str) -> float:
+    """Convert HH:MM:SS(.sss), MM:SS(.sss) or plain seconds to seconds."""
+    seconds = 0.0
+    for part in time_str.split(":"):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+def is_whisper_ready(info: Optional[Dict]) -> bool:
+    """True if a probed stream (see AudioProcessor.probe_audio) is already 16 kHz mono 16-bit PCM."""
+    return (
+        info is not None
+        and info.get("codec_name") == "pcm_s16le"
+        and info.get("sample_rate") == "16000"
+        and info.get("channels") == 1
+    )
+
+def file_sha1(path: Path, chunk_size: int = 1 << 20) -> str:
+    """Content hash of a file, read in chunks."""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# Loaded pipelines, shared by every SpeakerDiarizer in the process.
+_PIPELINE_CACHE: Dict[str, Pipeline] = {}
+# The pipeline isn't safe to run concurrently, and every diarizer shares it.
+_PIPELINE_LOCK = threading.Lock()
 
-def seconds_to_hms(seconds: float) -> str:
-    """Convert seconds (float) to HH:MM:SS.sss format."""
-    hours = int(seconds // 3600)
-    minutes = int((seconds % 3600) // 60)
-    secs = seconds - (hours * 3600 + minutes * 60)
-    return f"{hours:02d}:{minutes:02d}:{secs:06.3f}"
+def load_diarization_pipeline(device: torch.device) -> Pipeline:
+    """Loads the pyannote pipeline onto device once per process."""
+    with _PIPELINE_LOCK:
+        if str(device) not in _PIPELINE_CACHE:
+            # Note: You may need to set the HUGGINGFACE_TOKEN environment variable if required.
+            pipeline = Pipeline.from_pretrained("pyannote/speaker-diarization-3.1", use_auth_token= os.environ.get("HUGGINGFACE_TOKEN"))
+            # pyannote only runs on the GPU when explicitly moved there.
+            pipeline.to(device)
+            _PIPELINE_CACHE[str(device)] = pipeline
+        return _PIPELINE_CACHE[str(device)]
 
 class SpeakerDiarizer:
-    def __init__(self):
-        # This loads a pre-trained diarization pipeline.
-        # Note: You may need to set the HUGGINGFACE_TOKEN environment variable if required.
-        self.pipeline = Pipeline.from_pretrained("pyannote/speaker-diarization-3.1", use_auth_token= os.environ.get("HUGGINGFACE_TOKEN"))
+    def __init__(self, cache_dir: Optional[str] = None):
+        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        # This loads a pre-trained diarization pipeline (shared with other diarizers).
+        self.pipeline = load_diarization_pipeline(self.device)
+        self.audio = Audio(sample_rate=16000, mono="downmix")
+        # Diarization runs on its own CUDA stream so it can overlap with Whisper running
+        # on the default stream in another thread.
+        self.stream = torch.cuda.Stream() if self.device.type == "cuda" else None
+        # Results are cached by audio content, so re-running on identical audio skips pyannote.
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
     
-    def diarize(self, audio_file: Path):
+    @torch.inference_mode()
+    def diarize(self, audio: Union[Path, np.ndarray], num_speakers: Optional[int] = None):
         """
-        Runs speaker diarization on the given audio file.
+        Runs speaker diarization on an audio file, or on 16 kHz mono samples
+        (e.g. from AudioProcessor.trim_to_array).
+        A known num_speakers lets pyannote skip estimating the speaker count.
         Returns a list of segments, each with start time, end time, and speaker label.
         """
-        diarization = self.pipeline(str(audio_file))
+        in_memory = isinstance(audio, np.ndarray)
+        hints = {"num_speakers": num_speakers} if num_speakers else {}
+        cache_file = None
+        if self.cache_dir:
+            digest = hashlib.sha1(audio.tobytes()).hexdigest() if in_memory else file_sha1(audio)
+            suffix = f"_{num_speakers}spk" if num_speakers else ""
+            cache_file = self.cache_dir / f"{digest}{suffix}.json"
+            if cache_file.exists():
+                logger.info(f"Using cached diarization for {'audio ' + digest if in_memory else audio}")
+                return json.loads(cache_file.read_text())
+        if in_memory:
+            waveform, sample_rate = torch.from_numpy(audio).unsqueeze(0), 16000
+        else:
+            # Pass a pre-decoded waveform so resampling/downmix happen once, outside the pipeline.
+            waveform, sample_rate = self.audio(str(audio))
+        with _PIPELINE_LOCK, torch.cuda.stream(self.stream):
+            diarization = self.pipeline({"waveform": waveform.to(self.device), "sample_rate": sample_rate}, **hints)
+            if self.stream is not None:
+                self.stream.synchronize()
         segments = []
         # The pipeline returns segments as (start, end) with a speaker label.
         for turn, _, speaker in diarization.itertracks(yield_label=True):
@@ -66,136 +149,340 @@ class SpeakerDiarizer:
                 "end": turn.end,
                 "speaker": speaker
             })
+        if cache_file:
+            cache_file.write_text(json.dumps(segments))
         return segments
 
 
 class AudioProcessor:
-    def __init__(self, output_path: str, audio_format: str = "wav"):
+    def __init__(
+        self,
+        output_path: str,
+        audio_format: str = "wav",
+        cache_dir: Optional[str] = None,
+        trim_format: str = "wav"
+    ):
         self.output_path = Path(output_path)
         self.audio_format = audio_format
+        # Container of trimmed files: "wav" (16-bit PCM) or "flac" (lossless, about half the bytes).
+        if trim_format not in ("wav", "flac"):
+            raise ValueError(f"Unsupported trim_format: {trim_format}")
+        self.trim_format = trim_format
         self.output_path.mkdir(parents=True, exist_ok=True)
+        # Full downloads are kept here, keyed by URL, and reused across time ranges and runs.
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._download_locks = {}
+        self._download_locks_guard = threading.Lock()
 
-    def _run_command(self, command: List[str], error_message: str) -> None:
-        try:
-            subprocess.run(command, check=True, text=True, capture_output=True)
-        except subprocess.CalledProcessError as e:
-            logger.error(f"{error_message}: {e.stderr}")
-            raise
-
-    def download_audio(self, url: str, file_id: Optional[int]) -> Path:
+    def download_audio(
+        self,
+        url: str,
+        file_id: Optional[int],
+        section: Optional[Tuple[float, float]] = None
+    ) -> Path:
+        """
+        Downloads url's audio. With section=(start, end) in seconds, only that span
+        is fetched, and the file's timestamps start at 0 at `start`. An open-ended
+        range (end=inf) is fetched from `start` to the end of the video; only
+        (0, inf) is a plain full download.
+        """
+        if section and section[0] <= 0 and section[1] == float("inf"):
+            section = None  # the whole video
+        if self.cache_dir:
+            return self._download_cached(url, section)
         output_file = self.output_path / f"{file_id}_raw.{self.audio_format}"
-        command = [
-            "yt-dlp",
-            "-f", "bestaudio",
-            "--extract-audio",
-            "--audio-format", self.audio_format,
-            "-o", str(output_file),
-            url,
-        ]
-        
-        logger.info(f"Downloading audio from {url}")
-        self._run_command(command, "Error downloading audio")
+        self._download(url, output_file, section)
         return output_file
 
-    def trim_audio(
-        self, 
-        input_file: Path, 
-        start_time: str, 
-        end_time: Optional[str], 
-        file_id: Optional[int]
-    ) -> Path:
-        # output_file = self.output_path / f"{file_id}.{self.audio_format}"
+    def _download_cached(self, url: str, section: Optional[Tuple[float, float]] = None) -> Path:
+        name = hashlib.sha1(url.encode()).hexdigest()
+        if section:
+            name += f"_{section[0]:g}-{section[1]:g}"
+        output_file = self.cache_dir / f"{name}.{self.audio_format}"
+        # Ranges of the same URL may be prefetched concurrently; only one of them downloads.
+        with self._download_locks_guard:
+            lock = self._download_locks.setdefault(name, threading.Lock())
+        with lock:
+            if output_file.exists():
+                logger.info(f"Using cached download for {url}")
+            else:
+                self._download(url, output_file, section)
+        return output_file
 
-          # Force WAV output for trimmed segments, so pyannote can read them
-        output_file = self.output_path / f"{file_id}.wav"
+    def _download(self, url: str, output_file: Path, section: Optional[Tuple[float, float]] = None) -> None:
+        # Use the yt-dlp API in-process rather than starting a new interpreter per download.
+        options = {
+            "format": "bestaudio",
+            "outtmpl": str(output_file.with_suffix(".%(ext)s")),
+            "postprocessors": [{"key": "FFmpegExtractAudio", "preferredcodec": self.audio_format}],
+            "quiet": True,
+            "noprogress": True,
+        }
+        if section:
+            # Fetch only the requested span instead of the whole video.
+            options["download_ranges"] = download_range_func(None, [section])
+            options["force_keyframes_at_cuts"] = True
         
+        logger.info(f"Downloading audio from {url}")
+        try:
+            with YoutubeDL(options) as ydl:
+                ydl.download([url])
+        except DownloadError as e:
+            logger.error(f"Error downloading audio: {e}")
+            raise
+
+    def probe_audio(self, input_file: Path) -> Optional[Dict]:
+        """Returns codec_name, sample_rate and channels of the first audio stream, or None."""
         command = [
-            "ffmpeg","-y",
-            "-i", str(input_file),
-            "-ss", start_time,
+            "ffprobe", "-v", "error",
+            "-select_streams", "a:0",
+            "-show_entries", "stream=codec_name,sample_rate,channels",
+            "-of", "json",
+            str(input_file)
         ]
-        
-        if end_time:
-            command.extend(["-to", end_time])
-            
-        # command.extend([
-        #     "-c", "copy",
-        #     str(output_file)
-        # ])
-
-         # Re-encode to 16 kHz mono WAV for best results
-        command.extend([
-            "-vn",            # no video
-            "-acodec", "pcm_s16le",  # 16-bit PCM
-            "-ar", "16000",          # 16 kHz sample rate
-            "-ac", "1",              # mono
-            str(output_file)
-        ])
-        
-        logger.info(f"Trimming audio from {start_time} to {end_time}")
-        self._run_command(command, "Error trimming audio")
-        return output_file
+        try:
+            result = subprocess.run(command, check=True, text=True, capture_output=True)
+            streams = json.loads(result.stdout).get("streams", [])
+        except (subprocess.CalledProcessError, json.JSONDecodeError, OSError):
+            return None
+        return streams[0] if streams else None
 
-    def process_local_audio(
-    self,
-    local_file: Path,
-    start_time: str,
-    end_time: Optional[str],
-    file_id: Optional[int]
-    ) -> Path:
+    def trim_to_array(
+        self,
+        input_file: Path,
+        start_time: str,
+        end_time: Optional[str],
+        whisper_ready: Optional[bool] = None
+    ) -> np.ndarray:
         """
-        Trims a local audio file (e.g. .wav, .mp3, .m4a) using FFmpeg
-        and returns the trimmed file path.
+        Trims input_file and decodes it to 16 kHz mono float32 samples in memory.
+        Files that are already 16 kHz mono PCM are sliced directly with soundfile;
+        otherwise ffmpeg streams raw PCM over a pipe, so no intermediate WAV is written.
+        whisper_ready skips the ffprobe check when the caller already knows the answer.
         """
-        output_file = self.output_path / f"{file_id}.wav"
-
+        if whisper_ready is None:
+            whisper_ready = is_whisper_ready(self.probe_audio(input_file))
+        if whisper_ready:
+            start = int(time_to_seconds(start_time) * 16000)
+            stop = int(time_to_seconds(end_time) * 16000) if end_time else None
+            try:
+                samples, _ = sf.read(str(input_file), start=start, stop=stop, dtype="float32")
+                return samples
+            except RuntimeError:
+                pass  # e.g. PCM in a container libsndfile can't read; let ffmpeg handle it
         command = [
-            "ffmpeg", "-y",
-            "-i", str(local_file),
-            "-ss", start_time
+            "ffmpeg", "-y", "-loglevel", "error", "-nostats",
+            "-i", str(input_file),
+            "-ss", start_time,
         ]
         if end_time:
             command.extend(["-to", end_time])
-        # -c copy for lossless "copy" of the portion if formats match
-        # command.extend(["-c", "copy", str(output_file)])
-            # Re-encode to 16 kHz mono WAV
         command.extend([
             "-vn",
+            "-f", "s16le",
             "-acodec", "pcm_s16le",
             "-ar", "16000",
             "-ac", "1",
-            str(output_file)
+            "pipe:1"
         ])
 
-        logger.info(f"Trimming local audio from {start_time} to {end_time}")
-        self._run_command(command, "Error trimming local audio")
+        logger.info(f"Trimming audio from {start_time} to {end_time}")
+        try:
+            result = subprocess.run(command, check=True, capture_output=True)
+        except subprocess.CalledProcessError as e:
+            logger.error(f"Error trimming audio: {e.stderr.decode(errors='replace')}")
+            raise
+        return np.frombuffer(result.stdout, dtype=np.int16).astype(np.float32) / 32768.0
+
+    def trimmed_file(self, file_id: Optional[int]) -> Path:
+        """Path that write_trimmed writes the range with file_id to."""
+        return self.output_path / f"{file_id}.{self.trim_format}"
 
+    def write_trimmed(self, samples: np.ndarray, file_id: Optional[int]) -> Path:
+        """
+        Writes 16 kHz mono samples (from trim_to_array) to trimmed_file(file_id)
+        as 16-bit WAV or FLAC, without another ffmpeg pass.
+        """
+        output_file = self.trimmed_file(file_id)
+        sf.write(str(output_file), samples, 16000, format=self.trim_format.upper(), subtype="PCM_16")
         return output_file
 
-    def process_audio(
-        self, 
-        url: str, 
-        start_time: str, 
-        end_time: Optional[str], 
-        file_id: Optional[int]
-    ) -> Path:
-        raw_file = self.download_audio(url, file_id)
-        trimmed_file = self.trim_audio(raw_file, start_time, end_time, file_id)
-        raw_file.unlink(missing_ok=True)
-        return trimmed_file
+    def release_download(self, raw_file: Path) -> None:
+        """Deletes a raw download once it has been trimmed, unless it is kept in the cache."""
+        if not self.cache_dir:
+            raw_file.unlink(missing_ok=True)
 
 # transcriber.py
+import os
+import hashlib
+import json
+from abc import ABC, abstractmethod
 import whisper
+import numpy as np
+import soundfile as sf
+import torch
 from pathlib import Path
-from typing import List, Dict
+from typing import Any, Callable, List, Dict, Optional, Tuple, Union
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Loaded Whisper models keyed by (model_name, compile_encoder, int8, compiled batch size),
+# shared by every Transcriber.
+_MODEL_CACHE: Dict[Tuple[str, bool, bool, int], whisper.Whisper] = {}
+
+def to_half_precision(model: whisper.Whisper) -> whisper.Whisper:
+    """
+    Stores a Whisper model's weights in fp16, so the fp16 decode path doesn't cast
+    weights on every forward. LayerNorms stay fp32, since Whisper normalizes in fp32.
+    """
+    model.half()
+    for module in model.modules():
+        if isinstance(module, torch.nn.LayerNorm):
+            module.float()
+    return model
+
+def replace_linear_layers(model: torch.nn.Module, make_linear: Callable) -> torch.nn.Module:
+    """Replaces every nn.Linear in model (including Whisper's subclass) with make_linear(linear)."""
+    for module in list(model.modules()):
+        for name, child in module.named_children():
+            if isinstance(child, torch.nn.Linear):
+                setattr(module, name, make_linear(child))
+    return model
+
+def quantize_int8(model: whisper.Whisper, device: torch.device) -> whisper.Whisper:
+    """
+    Stores a Whisper model's Linear weights as int8: dynamic quantization on CPU,
+    bitsandbytes' LLM.int8() layers on CUDA. model must still be on the CPU.
+    """
+    if device.type == "cuda":
+        # Optional dependency: only needed for int8 on CUDA.
+        import bitsandbytes as bnb
+
+        def make_linear(linear: torch.nn.Linear) -> torch.nn.Module:
+            int8_linear = bnb.nn.Linear8bitLt(
+                linear.in_features, linear.out_features, bias=linear.bias is not None, has_fp16_weights=False
+            )
+            int8_linear.load_state_dict(linear.state_dict())
+            return int8_linear
+
+        # Weights are quantized when the layers are moved to the GPU.
+        return replace_linear_layers(model, make_linear).to(device)
+
+    # quantize_dynamic matches exact module types, so swap Whisper's Linear
+    # subclass for plain nn.Linear first.
+    def make_linear(linear: torch.nn.Linear) -> torch.nn.Module:
+        plain = torch.nn.Linear(linear.in_features, linear.out_features, bias=linear.bias is not None)
+        plain.load_state_dict(linear.state_dict())
+        return plain
+
+    model = replace_linear_layers(model, make_linear)
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+def load_whisper_model(
+    model_name: str,
+    compile_encoder: bool = False,
+    int8: bool = False,
+    batch_size: int = 16
+) -> whisper.Whisper:
+    """
+    Loads a Whisper model once per process; later calls return the same instance.
+    A compiled encoder is captured for batch_size (see Transcriber._decode_batch) and 1.
+    """
+    compile_encoder = compile_encoder and torch.cuda.is_available()
+    key = (model_name, compile_encoder, int8, batch_size if compile_encoder else 0)
+    if key not in _MODEL_CACHE:
+        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        model = whisper.load_model(model_name, device="cpu" if int8 else device)
+        if device.type == "cuda":
+            model = to_half_precision(model)
+        if int8:
+            model = quantize_int8(model, device)
+        if compile_encoder:
+            # Only the encoder is compiled: its mels are always padded to 30s, whereas the
+            # decoder would recompile for every new token length. reduce-overhead also
+            # captures it in a CUDA graph, removing per-kernel launch overhead.
+            model.encoder = torch.compile(model.encoder, mode="reduce-overhead", dynamic=False)
+            # The encoder only ever sees two batch sizes: full decode batches (_decode_batch
+            # pads to batch_size) and single mels from long-form transcribe(). Pay the
+            # compile/capture cost for both here rather than in the middle of a run.
+            with torch.inference_mode():
+                for size in sorted({1, batch_size}):
+                    mel = torch.zeros(
+                        size, model.dims.n_mels, whisper.audio.N_FRAMES, dtype=torch.float16, device=model.device
+                    )
+                    for _ in range(3):  # warm up, record the CUDA graph, replay it
+                        model.encoder(mel)
+        _MODEL_CACHE[key] = model
+    return _MODEL_CACHE[key]
+
+def segment_bounds(segments: List[Dict], sample_rate: int = whisper.audio.SAMPLE_RATE) -> np.ndarray:
+    """
+    The [start, end) sample indices of each segment as an (N, 2) int64 array,
+    computed in one vectorized pass rather than per segment dict.
+    """
+    times = np.fromiter(
+        (t for seg in segments for t in (seg["start"], seg["end"])), dtype=np.float64, count=2 * len(segments)
+    ).reshape(-1, 2)
+    return (times * sample_rate).astype(np.int64)
+
 class Transcriber:
-    def __init__(self, model_name: str = "base"):
-        self.model = whisper.load_model(model_name)
-        
+    backend = "openai-whisper"
+    # Optional smaller model for short clips (see __init__); backends without one leave these unset.
+    fast_model = None
+    fast_model_name: Optional[str] = None
+    fast_max_duration = 0.0
+    int8 = False
+    compiled = False  # encoder compiled for batch_size (see load_whisper_model)
+
+    def __init__(
+        self,
+        model_name: str = "base",
+        batch_size: int = 16,
+        compile_encoder: bool = False,
+        cache_dir: Optional[str] = None,
+        fast_model_name: Optional[str] = None,
+        fast_max_duration: float = 6.0,
+        int8: bool = False
+    ):
+        """
+        fast_model_name (e.g. "tiny.en") is used instead of model_name for clips shorter
+        than fast_max_duration seconds, where the larger model rarely changes the text.
+        int8 stores Linear weights as int8 (see quantize_int8).
+        """
+        self.model = load_whisper_model(model_name, compile_encoder, int8, batch_size)
+        self.model_name = model_name
+        self.device = self.model.device
+        self.int8 = int8
+        self.compiled = compile_encoder and torch.cuda.is_available()
+        if fast_model_name:
+            self.fast_model = load_whisper_model(fast_model_name, compile_encoder, int8, batch_size)
+            self.fast_model_name = fast_model_name
+            self.fast_max_duration = fast_max_duration
+        self.batch_size = batch_size
+        self._init_cache(cache_dir)
+
+    def _init_cache(self, cache_dir: Optional[str]) -> None:
+        # Transcripts are cached by audio content, segments and model, so re-running
+        # on identical audio skips Whisper.
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def _cache_file(self, audio: np.ndarray, segments: List[Dict]) -> Optional[Path]:
+        if not self.cache_dir:
+            return None
+        digest = hashlib.sha1(audio.tobytes())
+        digest.update(json.dumps(segments, sort_keys=True).encode())
+        # Precision follows the device (fp16 on GPU, fp32 on CPU), so it's part of the key
+        digest.update(f"{self.backend}/{self.model_name}{'/int8' if self.int8 else ''}/{self.device.type}".encode())
+        if self.fast_model_name:
+            digest.update(f"/{self.fast_model_name}<{self.fast_max_duration}".encode())
+        return self.cache_dir / f"{digest.hexdigest()}.json"
+
+    @torch.inference_mode()
     def transcribe_file(self, audio_file: Path) -> str:
         try:
             logger.info(f"Transcribing {audio_file}")
@@ -207,6 +494,209 @@ class Transcriber:
             logger.error(f"Error transcribing {audio_file}: {e}")
             raise
 
+    def transcribe_segments(self, audio_file: Union[Path, np.ndarray], segments: List[Dict]) -> List[str]:
+        """
+        Transcribes each diarized segment of audio_file (a path, or 16 kHz samples).
+        The audio is decoded once and sliced in memory; segments that fit in
+        Whisper's 30s window are decoded together in batches of batch_size.
+        """
+        return self.transcribe_many([(audio_file, segments)])[0]
+
+    @torch.inference_mode()
+    def transcribe_many(self, items: List[Tuple[Union[Path, np.ndarray], List[Dict]]]) -> List[List[str]]:
+        """
+        Like transcribe_segments, for several (audio_file, segments) pairs at once.
+        Decode batches are shared across files, so many short ranges still fill them.
+        """
+        try:
+            results: List[List[str]] = [[] for _ in items]
+            clips = []
+            pending = []  # (item index, segment count, cache file) of items not in the cache
+            for index, (audio_file, segments) in enumerate(items):
+                if isinstance(audio_file, np.ndarray):
+                    source = "in-memory audio"
+                    audio = audio_file
+                else:
+                    source = audio_file
+                    audio = self._load_audio(audio_file)
+                cache_file = self._cache_file(audio, segments)
+                if cache_file and cache_file.exists():
+                    logger.info(f"Using cached transcription for {source}")
+                    results[index] = json.loads(cache_file.read_text())
+                    continue
+                logger.info(f"Transcribing {len(segments)} segments of {source}")
+                clips.extend(audio[start:end] for start, end in segment_bounds(segments))
+                pending.append((index, len(segments), cache_file))
+            transcripts = self.transcribe_batch(clips)
+            offset = 0
+            for index, count, cache_file in pending:
+                results[index] = transcripts[offset:offset + count]
+                offset += count
+                if cache_file:
+                    cache_file.write_text(json.dumps(results[index]))
+            logger.info(f"Transcription complete for {len(items)} files")
+            return results
+        except Exception as e:
+            logger.error(f"Error transcribing {len(items)} files: {e}")
+            raise
+
+    @torch.inference_mode()
+    def transcribe_batch(self, chunks: List[np.ndarray]) -> List[str]:
+        """
+        Transcribes in-memory 16 kHz clips, returning one transcript per clip.
+        Clips that fit in Whisper's 30s window are decoded together in batches
+        of batch_size (clips under fast_max_duration by the fast model, if set);
+        longer ones go through Whisper's own long-form chunking.
+        """
+        fast_max_samples = int(self.fast_max_duration * whisper.audio.SAMPLE_RATE)
+        transcripts = [""] * len(chunks)
+        batched = []
+        fast_batched = []
+        for i, chunk in enumerate(chunks):
+            if len(chunk) > whisper.audio.N_SAMPLES:
+                transcripts[i] = self.model.transcribe(chunk, fp16=self.model.device.type == "cuda")["text"].strip()
+            elif self.fast_model is not None and len(chunk) < fast_max_samples:
+                fast_batched.append(i)
+            else:
+                batched.append(i)
+        for model, indices_to_decode in ((self.model, batched), (self.fast_model, fast_batched)):
+            for b in range(0, len(indices_to_decode), self.batch_size):
+                indices = indices_to_decode[b:b + self.batch_size]
+                texts = self._decode_batch([chunks[i] for i in indices], model)
+                for i, text in zip(indices, texts):
+                    transcripts[i] = text
+        return transcripts
+
+    @staticmethod
+    def _load_audio(audio_file: Path) -> np.ndarray:
+        """
+        Reads audio_file as float32 samples at Whisper's sample rate.
+        Trimmed files are already 16 kHz mono WAV, so they're read directly
+        instead of being piped through another ffmpeg process.
+        """
+        try:
+            samples, sample_rate = sf.read(str(audio_file), dtype="float32")
+            if sample_rate == whisper.audio.SAMPLE_RATE and samples.ndim == 1:
+                return samples
+        except RuntimeError:
+            pass  # not a format libsndfile can read
+        return whisper.load_audio(str(audio_file))
+
+    def _decode_batch(self, clips: List[np.ndarray], model: whisper.Whisper) -> List[str]:
+        mels = torch.stack([
+            # Compute each spectrogram on the model's device rather than on the CPU.
+            whisper.log_mel_spectrogram(whisper.pad_or_trim(clip), model.dims.n_mels, device=model.device)
+            for clip in clips
+        ])
+        if self.compiled:
+            # Encode at the one batch size the compiled encoder was captured for, then let
+            # decode skip its own encoder pass and decode only the real clips. The clone
+            # keeps the features from being overwritten by the next CUDA graph replay.
+            padded = mels.new_zeros((self.batch_size, *mels.shape[1:]), dtype=torch.float16)
+            padded[:len(clips)] = mels
+            mels = model.encoder(padded)[:len(clips)].clone()
+        options = whisper.DecodingOptions(fp16=model.device.type == "cuda")
+        results = whisper.decode(model, mels, options)
+        return [result.text.strip() for result in results]
+
+class ClipTranscriber(Transcriber, ABC):
+    """
+    Base for backends that transcribe one clip at a time through _transcribe,
+    which takes a path or 16 kHz float32 samples.
+    """
+    def transcribe_file(self, audio_file: Path) -> str:
+        try:
+            logger.info(f"Transcribing {audio_file}")
+            transcript = self._transcribe(str(audio_file))
+            logger.info(f"Transcription complete for {audio_file}")
+            return transcript
+        except Exception as e:
+            logger.error(f"Error transcribing {audio_file}: {e}")
+            raise
+
+    def transcribe_batch(self, chunks: List[np.ndarray]) -> List[str]:
+        return [self._transcribe(chunk) if len(chunk) else "" for chunk in chunks]
+
+    @abstractmethod
+    def _transcribe(self, audio: Union[str, np.ndarray]) -> str:
+        """Transcribe a path or 16 kHz float32 samples and return the text."""
+
+# Loaded faster-whisper models (faster_whisper.WhisperModel) keyed by model_name.
+_FASTER_MODEL_CACHE: Dict[str, Any] = {}
+
+class FasterWhisperTranscriber(ClipTranscriber):
+    """
+    Transcriber backed by faster-whisper (CTranslate2), with int8 weights.
+    Same interface as Transcriber; select it with AppConfig(backend="faster-whisper").
+    """
+    backend = "faster-whisper"
+
+    def __init__(
+        self,
+        model_name: str = "base",
+        batch_size: int = 16,
+        compile_encoder: bool = False,
+        cache_dir: Optional[str] = None
+    ):
+        # Optional dependency: only needed when this backend is selected.
+        from faster_whisper import WhisperModel
+
+        if model_name not in _FASTER_MODEL_CACHE:
+            cuda = torch.cuda.is_available()
+            _FASTER_MODEL_CACHE[model_name] = WhisperModel(
+                model_name,
+                device="cuda" if cuda else "cpu",
+                compute_type="int8_float16" if cuda else "int8"
+            )
+        self.model = _FASTER_MODEL_CACHE[model_name]
+        self.model_name = model_name
+        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.batch_size = batch_size
+        self._init_cache(cache_dir)
+
+    def _transcribe(self, audio: Union[str, np.ndarray]) -> str:
+        segments, _ = self.model.transcribe(audio, beam_size=1, vad_filter=False)
+        return " ".join(segment.text.strip() for segment in segments).strip()
+
+# Loaded whisper.cpp models (pywhispercpp.model.Model) keyed by model_name.
+_WHISPER_CPP_MODEL_CACHE: Dict[str, Any] = {}
+
+class WhisperCppTranscriber(ClipTranscriber):
+    """
+    Transcriber backed by whisper.cpp (via pywhispercpp), for CPU-only hosts:
+    quantized weights, a reused KV cache and SIMD kernels.
+    Select it with AppConfig(backend="whisper.cpp").
+    """
+    backend = "whisper.cpp"
+
+    def __init__(
+        self,
+        model_name: str = "base",
+        batch_size: int = 16,
+        compile_encoder: bool = False,
+        cache_dir: Optional[str] = None
+    ):
+        # Optional dependency: only needed when this backend is selected.
+        from pywhispercpp.model import Model
+
+        if model_name not in _WHISPER_CPP_MODEL_CACHE:
+            _WHISPER_CPP_MODEL_CACHE[model_name] = Model(model_name, n_threads=os.cpu_count())
+        self.model = _WHISPER_CPP_MODEL_CACHE[model_name]
+        self.model_name = model_name
+        self.device = torch.device("cpu")
+        self.batch_size = batch_size
+        self._init_cache(cache_dir)
+
+    def _transcribe(self, audio: Union[str, np.ndarray]) -> str:
+        return " ".join(segment.text.strip() for segment in self.model.transcribe(audio)).strip()
+
+# Transcriber classes by AppConfig.backend.
+TRANSCRIBER_BACKENDS = {
+    Transcriber.backend: Transcriber,
+    FasterWhisperTranscriber.backend: FasterWhisperTranscriber,
+    WhisperCppTranscriber.backend: WhisperCppTranscriber,
+}
+
 class TranscriptionWriter:
     def __init__(self, output_dir: Path):
         self.output_dir = output_dir
@@ -218,92 +708,240 @@ class TranscriptionWriter:
         output_file: str = "list.txt"
     ) -> None:
         output_path = self.output_dir / output_file
-        with output_path.open("w") as f:
-            for entry in transcriptions:
-                f.write(f"{entry['file']}|{entry['transcript']}\n")
+        # Build the whole file in memory and write it with a single encode + write.
+        payload = "".join(f"{entry['file']}|{entry['transcript']}\n" for entry in transcriptions)
+        output_path.write_bytes(payload.encode("utf-8"))
         logger.info(f"Transcriptions written to {output_path}")
 
 # main.py
-from typing import List
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 import logging
 from pathlib import Path
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
-def process_videos(config: AppConfig, videos: List[VideoConfig]) -> None:
-    audio_processor = AudioProcessor(config.audio_output_dir, config.audio_format)
-    transcriber = Transcriber(config.whisper_model)
-    writer = TranscriptionWriter(Path(config.transcription_output_dir))
-    diarizer = SpeakerDiarizer()  # Initialize diarization pipeline
+def prefetch(fn: Callable, jobs: Iterable[Tuple], depth: int = 2) -> Iterator[Tuple[Tuple, Future]]:
+    """
+    Yields (job, future) pairs in order while up to `depth` calls of fn(*job)
+    run ahead in background threads, so network/ffmpeg work for the next
+    jobs overlaps with whatever the caller does with the current one.
+    """
+    with ThreadPoolExecutor(max_workers=depth) as pool:
+        pending = deque()
+        for job in jobs:
+            pending.append((job, pool.submit(fn, *job)))
+            if len(pending) > depth:
+                yield pending.popleft()
+        while pending:
+            yield pending.popleft()
+
+def merge_segments(segments: List[Dict], max_gap: float = 0.3) -> List[Dict]:
+    """
+    Merges consecutive segments of the same speaker separated by at most max_gap seconds,
+    so Whisper sees fewer, longer clips (with more context) instead of many short turns.
+    """
+    merged = []
+    for segment in segments:
+        if merged and merged[-1]["speaker"] == segment["speaker"] and segment["start"] - merged[-1]["end"] <= max_gap:
+            merged[-1]["end"] = max(merged[-1]["end"], segment["end"])
+        else:
+            merged.append(dict(segment))
+    return merged
+
+def covering_section(time_ranges: List[TimeRange]) -> Tuple[float, float]:
+    """The (start, end) span in seconds covering all time_ranges; end is inf if any range is open-ended."""
+    start = min(time_to_seconds(time_range.start_time) for time_range in time_ranges)
+    if any(not time_range.end_time for time_range in time_ranges):
+        return start, float("inf")
+    return start, max(time_to_seconds(time_range.end_time) for time_range in time_ranges)
+
+def shift_time(time_str: Optional[str], offset: float) -> Optional[str]:
+    """time_str moved `offset` seconds earlier (as seconds, which ffmpeg accepts)."""
+    if not time_str or not offset:
+        return time_str
+    return f"{time_to_seconds(time_str) - offset:.3f}"
+
+def trim_ranges(
+    audio_processor: AudioProcessor,
+    input_file: Path,
+    time_ranges: List[TimeRange],
+    workers: int,
+    offset: float = 0.0
+) -> Iterator[Tuple[TimeRange, Future]]:
+    """
+    Yields (time_range, future) pairs in order, where each future resolves to the
+    range's samples (see AudioProcessor.trim_to_array). Each range is also written
+    to its trimmed_file, which the transcription list points at. Up to `workers`
+    trims run at once, so ffmpeg startup costs overlap instead of adding up.
+    offset is the source time at which input_file starts (for section downloads).
+    """
+    # Probe once for all ranges rather than once per trim.
+    whisper_ready = is_whisper_ready(audio_processor.probe_audio(input_file))
+
+    def trim(time_range: TimeRange) -> np.ndarray:
+        samples = audio_processor.trim_to_array(
+            input_file,
+            shift_time(time_range.start_time, offset),
+            shift_time(time_range.end_time, offset),
+            whisper_ready
+        )
+        audio_processor.write_trimmed(samples, time_range.id)
+        return samples
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        trims = [(time_range, pool.submit(trim, time_range)) for time_range in time_ranges]
+        yield from trims
+
+def audio_dir_entry(audio_processor: AudioProcessor, transcription_root: Path) -> Path:
+    """
+    The audio output dir relative to transcription_root, computed once per run.
+    relpath rather than Path.relative_to, since the two are usually siblings.
+    """
+    return Path(os.path.relpath(audio_processor.output_path.absolute(), transcription_root))
+
+def cache_paths(config: AppConfig) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    """Download, diarization and transcription cache directories for config (None when caching is off)."""
+    if not config.cache_dir:
+        return None, None, None
+    return (
+        os.path.join(config.cache_dir, "downloads"),
+        os.path.join(config.cache_dir, "diarization"),
+        os.path.join(config.cache_dir, "transcription")
+    )
+
+def build_models(config: AppConfig) -> Tuple["Transcriber", "SpeakerDiarizer"]:
+    """Builds a transcriber and diarizer for config, to be reused across process_* calls."""
+    _, diarization_cache, transcription_cache = cache_paths(config)
+    if config.backend not in TRANSCRIBER_BACKENDS:
+        raise ValueError(f"Unknown transcription backend: {config.backend}")
+    transcriber_cls = TRANSCRIBER_BACKENDS[config.backend]
+    options = {}
+    if transcriber_cls is Transcriber:
+        options["int8"] = config.int8
+        if config.fast_whisper_model:
+            options.update(fast_model_name=config.fast_whisper_model, fast_max_duration=config.fast_max_duration)
+    transcriber = transcriber_cls(
+        config.whisper_model,
+        compile_encoder=config.compile_encoder,
+        cache_dir=transcription_cache,
+        **options
+    )
+    return transcriber, SpeakerDiarizer(diarization_cache)
+
+def process_videos(
+    config: AppConfig,
+    videos: List[VideoConfig],
+    transcriber: Optional[Transcriber] = None,
+    diarizer: Optional[SpeakerDiarizer] = None
+) -> None:
+    download_cache, _, _ = cache_paths(config)
+    audio_processor = AudioProcessor(
+        config.audio_output_dir, config.audio_format, download_cache, config.trim_format
+    )
+    if transcriber is None or diarizer is None:
+        transcriber, diarizer = build_models(config)
+    transcription_root = Path(config.transcription_output_dir).absolute()
+    writer = TranscriptionWriter(transcription_root)
+    # Output entries are paths relative to the transcription dir (e.g. "../extracted_audio/1.wav").
+    audio_dir = audio_dir_entry(audio_processor, transcription_root)
     
     transcriptions = []
-    
-    for video in videos:
-        for time_range in video.time_ranges:
+
+    def download_and_trim(
+        url: str,
+        time_ranges: List[TimeRange],
+        num_speakers: Optional[int]
+    ) -> List[Tuple[TimeRange, np.ndarray]]:
+        """
+        Stage 1: downloads the part of url covering all its time ranges once,
+        then trims each range into memory.
+        """
+        section = covering_section(time_ranges)
+        raw_file = audio_processor.download_audio(url, time_ranges[0].id, section)
+        ranges = []
+        try:
+            for time_range, trim in trim_ranges(
+                audio_processor, raw_file, time_ranges, config.trim_workers, offset=section[0]
+            ):
+                try:
+                    ranges.append((time_range, trim.result()))
+                except Exception as e:
+                    logger.error(f"Error trimming video {url} at {time_range}: {e}")
+        finally:
+            audio_processor.release_download(raw_file)
+        return ranges
+
+    def diarize(
+        url: str,
+        trimmed: Future,
+        num_speakers: Optional[int]
+    ) -> List[Tuple[TimeRange, np.ndarray, List[Dict]]]:
+        """Stage 2: diarizes the ranges stage 1 trimmed for url."""
+        ranges = []
+        for time_range, samples in trimmed.result():
             try:
-                # Process audio
-                audio_file = audio_processor.process_audio(
-                    video.url,
-                    time_range.start_time,
-                    time_range.end_time,
-                    time_range.id
-                )
-
-                logger.info(f"Running diarization on {audio_file}")
-                # Run speaker diarization on the trimmed audio file.
-                diarization_segments = diarizer.diarize(audio_file)
-
-                speaker_transcriptions = []
-                # For each diarized segment, extract that audio and transcribe it.
-                for i, segment in enumerate(diarization_segments):
-                    seg_start = seconds_to_hms(segment["start"])
-                    seg_end = seconds_to_hms(segment["end"])
-                    # Use a compound id (e.g. "1_0", "1_1", …) for the segment file name.
-                    segment_file = audio_processor.trim_audio(
-                        audio_file,
-                        seg_start,
-                        seg_end,
-                        file_id=f"{time_range.id}_{i}"
-                    )
-                    transcript_segment = transcriber.transcribe_file(segment_file)
-                    # Optionally, remove the segment file after transcription.
-                    segment_file.unlink(missing_ok=True)
-                    speaker_transcriptions.append(f"{segment['speaker']}: {transcript_segment}")
-                
+                logger.info(f"Running diarization on {url} at {time_range}")
+                segments = merge_segments(diarizer.diarize(samples, num_speakers), config.merge_gap)
+                ranges.append((time_range, samples, segments))
+            except Exception as e:
+                logger.error(f"Error diarizing video {url} at {time_range}: {e}")
+        return ranges
+
+    # Group time ranges by URL so each video is downloaded only once.
+    ranges_by_url: Dict[Tuple[str, Optional[int]], List[TimeRange]] = {}
+    for video in videos:
+        ranges_by_url.setdefault((video.url, video.num_speakers), []).extend(video.time_ranges)
+    jobs = [(url, time_ranges, num_speakers) for (url, num_speakers), time_ranges in ranges_by_url.items() if time_ranges]
+
+    # Three overlapping stages: while video N is transcribed on the main thread, video N+1
+    # is diarized (on its own CUDA stream) and the next ones are downloaded and trimmed.
+    trimmed = prefetch(download_and_trim, jobs, config.prefetch_depth)
+    diarize_jobs = ((url, trim_future, num_speakers) for (url, _, num_speakers), trim_future in trimmed)
+    for (url, _, _), job_future in prefetch(diarize, diarize_jobs, 1):
+        try:
+            ranges = job_future.result()
+
+            # Transcribe the segments of all ranges together so they share decode batches.
+            range_transcripts = transcriber.transcribe_many(
+                [(samples, diarization_segments) for _, samples, diarization_segments in ranges]
+            )
+            for (time_range, _, diarization_segments), segment_transcripts in zip(ranges, range_transcripts):
+                speaker_transcriptions = [
+                    f"{segment['speaker']}: {transcript_segment}"
+                    for segment, transcript_segment in zip(diarization_segments, segment_transcripts)
+                ]
                 # Combine the diarized segment transcripts into one full transcript.
-                combined_transcript = "\n".join(speaker_transcriptions)
-                
-                # Transcribe audio
-                # transcript = transcriber.transcribe_file(audio_file)
-                
-                # Store result
                 transcriptions.append({
-                    "file": os.path.relpath(audio_file, start=config.transcription_output_dir),
-                    "transcript": combined_transcript
+                    "file": str(audio_dir / audio_processor.trimmed_file(time_range.id).name),
+                    "transcript": "\n".join(speaker_transcriptions)
                 })
-                # transcriptions.append({
-                #     "file": audio_file.relative_to(config.transcription_output_dir),
-                #     "transcript": transcript
-                # })
-                  # Optionally, remove the original trimmed audio file if not needed.
-                audio_file.unlink(missing_ok=True)
-                
-            except Exception as e:
-                logger.error(f"Error processing video {video.url} at {time_range}: {e}")
-                continue
+        except Exception as e:
+            logger.error(f"Error processing video {url}: {e}")
+            continue
     
     # Write all transcriptions
     writer.write_transcriptions(transcriptions)
 
-def process_audios(config: AppConfig, audios: List[LocalAudioConfig]) -> None:
+def process_audios(
+    config: AppConfig,
+    audios: List[LocalAudioConfig],
+    transcriber: Optional[Transcriber] = None,
+    diarizer: Optional[SpeakerDiarizer] = None
+) -> None:
     """
     Process local audio files (e.g. .wav, .mp3, .m4a), apply trimming,
     then run speaker diarization and Whisper transcription.
+    Pass a prebuilt transcriber/diarizer (see build_models) to reuse them across calls.
     """
-    audio_processor = AudioProcessor(config.audio_output_dir, config.audio_format)
-    transcriber = Transcriber(config.whisper_model)
-    writer = TranscriptionWriter(Path(config.transcription_output_dir))
-    diarizer = SpeakerDiarizer()
+    audio_processor = AudioProcessor(config.audio_output_dir, config.audio_format, trim_format=config.trim_format)
+    if transcriber is None or diarizer is None:
+        transcriber, diarizer = build_models(config)
+    transcription_root = Path(config.transcription_output_dir).absolute()
+    writer = TranscriptionWriter(transcription_root)
+    audio_dir = audio_dir_entry(audio_processor, transcription_root)
     
     transcriptions = []
     
@@ -313,51 +951,32 @@ def process_audios(config: AppConfig, audios: List[LocalAudioConfig]) -> None:
             logger.error(f"File does not exist: {audio_path}")
             continue
         
-        for time_range in audio.time_ranges:
+        for time_range, trim in trim_ranges(audio_processor, audio_path, audio.time_ranges, config.trim_workers):
             try:
-                # Instead of downloading, process the *local* file
-                trimmed_file = audio_processor.process_local_audio(
-                    audio_path,
-                    time_range.start_time,
-                    time_range.end_time,
-                    time_range.id
-                )
-
-                # Run speaker diarization on the trimmed file
-                logger.info(f"Running diarization on {trimmed_file}")
-                diarization_segments = diarizer.diarize(trimmed_file)
-
-                speaker_transcriptions = []
-                # For each diarized speaker turn, trim further & transcribe
-                for i, segment in enumerate(diarization_segments):
-                    seg_start = seconds_to_hms(segment["start"])
-                    seg_end   = seconds_to_hms(segment["end"])
-                    
-                    segment_file = audio_processor.trim_audio(
-                        trimmed_file,
-                        seg_start,
-                        seg_end,
-                        file_id=f"{time_range.id}_{i}"
-                    )
-                    transcript_segment = transcriber.transcribe_file(segment_file)
-                    segment_file.unlink(missing_ok=True)
-                    
-                    # Tag the speaker + transcript
-                    speaker_transcriptions.append(
-                        f"{segment['speaker']}: {transcript_segment}"
-                    )
+                # Instead of downloading, trim the *local* file straight into memory
+                samples = trim.result()
+
+                # Run speaker diarization on the trimmed samples
+                logger.info(f"Running diarization on {audio_path} at {time_range}")
+                diarization_segments = merge_segments(diarizer.diarize(samples, audio.num_speakers), config.merge_gap)
+
+                # Transcribe every diarized speaker turn in batches
+                segment_transcripts = transcriber.transcribe_segments(samples, diarization_segments)
+
+                # Tag the speaker + transcript
+                speaker_transcriptions = [
+                    f"{segment['speaker']}: {transcript_segment}"
+                    for segment, transcript_segment in zip(diarization_segments, segment_transcripts)
+                ]
 
                 # Join all speaker segments for the final transcript
                 combined_transcript = "\n".join(speaker_transcriptions)
                 
                 # Save in our output list
                 transcriptions.append({
-                    "file": os.path.relpath(trimmed_file, start=config.transcription_output_dir),
+                    "file": str(audio_dir / audio_processor.trimmed_file(time_range.id).name),
                     "transcript": combined_transcript
                 })
-                
-                # (Optional) remove the trimmed_file to keep things clean
-                trimmed_file.unlink(missing_ok=True)
 
             except Exception as e:
                 logger.error(f"Error processing local audio {audio_path} at {time_range}: {e}")
@@ -394,7 +1013,9 @@ def main():
         
     ]
     
-    process_videos(config, videos)
+    # Load the models once and reuse them for every batch below.
+    transcriber, diarizer = build_models(config)
+    process_videos(config, videos, transcriber, diarizer)
 
     #     # Example 2: process a local .wav, .mp3, or .m4a
     # local_audios = [
@@ -413,7 +1034,7 @@ def main():
     #         ]
     #     ),
     # ]
-    # process_audios(config, local_audios)
+    # process_audios(config, local_audios, transcriber, diarizer)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -8,50 +8,31 @@ import streamlit as st
 import os
 import time
 import re
+import json
+import hashlib
 import tempfile
+import warnings
+from typing import Iterable, Iterator, List
+import numpy as np
+import torch
 
 # Local imports from our modules:
 from app.config import TimeRange
 from app.audio_processor import (
     create_temp_file,
-    trim_audio,
+    load_audio,
     download_youtube_audio
 )
-from app.diarizer import run_diarization
+from app.diarizer import run_diarization, single_speaker_segments
 from app.transcriber import WhisperTranscriber
 
 # ----- Utility functions ------
 
-def seconds_to_hms(seconds: float) -> str:
-    """Convert seconds (float) to HH:MM:SS.sss format."""
-    hours = int(seconds // 3600)
-    minutes = int((seconds % 3600) // 60)
-    secs = seconds - (hours * 3600 + minutes * 60)
-    return f"{hours:02d}:{minutes:02d}:{secs:06.3f}"
-
-def hms_to_seconds(hms: str) -> float:
-    """Convert HH:MM:SS or HH:MM:SS.sss to seconds."""
-    if '.' in hms:
-        time_part, ms_part = hms.split('.')
-        ms = float(f"0.{ms_part}")
-    else:
-        time_part = hms
-        ms = 0.0
-    parts = time_part.split(':')
-    if len(parts) == 3:
-        h, m, s = parts
-        seconds = int(h) * 3600 + int(m) * 60 + int(s) + ms
-    elif len(parts) == 2:
-        m, s = parts
-        seconds = int(m) * 60 + int(s) + ms
-    else:
-        seconds = int(parts[0]) + ms
-    return seconds
+_TIME_RE = re.compile(r'^([0-9]{1,2}:)?[0-5]?[0-9]:[0-5][0-9](\.[0-9]{1,3})?$')
 
 def validate_time_format(time_str: str) -> bool:
     """Validate time format (HH:MM:SS or MM:SS or seconds)."""
-    pattern = r'^([0-9]{1,2}:)?[0-5]?[0-9]:[0-5][0-9](\.[0-9]{1,3})?$'
-    return re.match(pattern, time_str) is not None
+    return _TIME_RE.match(time_str) is not None
 
 # ----- Main Streamlit layout & logic ------
 
@@ -106,79 +87,206 @@ def display_header():
         st.title("Audio Transcription & Speaker Diarization")
         st.markdown("Process audio files or YouTube videos to get transcriptions with speaker identification.")
 
-def get_whisper_models():
-    """Return available Whisper models for the dropdown."""
-    return ["tiny", "base", "small", "medium", "large"]
+# Available Whisper models for the dropdown.
+WHISPER_MODELS = ("tiny", "base", "small", "medium", "large")
 
-def display_transcription(transcriptions):
-    """Display final transcription results in a styled container."""
-    if not transcriptions:
-        st.warning("No transcription results available.")
-        return
+SPEAKER_COLORS = ("#FF9AA2", "#FFB7B2", "#FFDAC1", "#E2F0CB", "#B5EAD7", "#C7CEEA")
+
+def display_transcription(batches: Iterable[List[dict]]) -> List[dict]:
+    """
+    Display transcription results in a styled container as they arrive.
+    Accepts batches of segments (e.g. from process_audio_stream), re-renders
+    once per batch, and returns all collected results.
+    """
     st.subheader("Transcription Results")
-    with st.container():
-        st.markdown('<div class="output-container">', unsafe_allow_html=True)
-        # Collect all unique speakers
-        speakers = list(set(t["speaker"] for t in transcriptions))
-        # Assign colors to each speaker label
-        colors = ["#FF9AA2", "#FFB7B2", "#FFDAC1", "#E2F0CB", "#B5EAD7", "#C7CEEA"]
-        speaker_colors = {speakers[i]: colors[i % len(colors)] for i in range(len(speakers))}
-        # Loop through segments and print
-        for seg in transcriptions:
+    placeholder = st.empty()
+    # Colors are assigned in order of first appearance, so they're stable across reruns.
+    speaker_colors = {}
+    results = []
+    lines = []
+    for batch in batches:
+        for seg in batch:
             spk = seg["speaker"]
-            txt = seg["text"]
-            start = seg["start"]
-            end   = seg["end"]
-            timestamp = f"{start:.2f}s - {end:.2f}s"
-            speaker_label = f'<span class="speaker-label" style="background-color: {speaker_colors[spk]};">{spk}</span>'
-            st.markdown(f'{speaker_label} <small>({timestamp})</small> {txt}', unsafe_allow_html=True)
-        st.markdown('</div>', unsafe_allow_html=True)
+            color = speaker_colors.setdefault(spk, SPEAKER_COLORS[len(speaker_colors) % len(SPEAKER_COLORS)])
+            timestamp = f"{seg['start']:.2f}s - {seg['end']:.2f}s"
+            speaker_label = f'<span class="speaker-label" style="background-color: {color};">{spk}</span>'
+            lines.append(f'{speaker_label} <small>({timestamp})</small> {seg["text"]}')
+        results.extend(batch)
+        # Re-render into the same element, rather than one Streamlit element per segment.
+        placeholder.markdown(
+            '<div class="output-container">' + "<br>".join(lines) + '</div>',
+            unsafe_allow_html=True
+        )
+    if not results:
+        placeholder.warning("No transcription results available.")
+    return results
+
+def transcription_text(transcriptions) -> str:
+    """Plain-text transcript for the download button."""
+    return "\n\n".join(
+        f"{t['speaker']} ({t['start']:.2f}s - {t['end']:.2f}s): {t['text']}"
+        for t in transcriptions
+    )
+
+# On-disk result caches. Set ATP_CACHE_DIR to move them, or to "" to turn them
+# off; they are trimmed (least recently used first) to ATP_CACHE_MAX_MB.
+CACHE_DIR = os.environ.get("ATP_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "atp")) or None
+
+def cache_max_mb(default: float = 200.0) -> float:
+    """Read ATP_CACHE_MAX_MB, falling back to default (with a warning) if it isn't a valid size."""
+    value = os.environ.get("ATP_CACHE_MAX_MB")
+    if value is None:
+        return default
+    try:
+        max_mb = float(value)
+        # "nan" or a negative size would empty the cache on every run
+        if not max_mb >= 0:
+            raise ValueError(value)
+        return max_mb
+    except ValueError:
+        warnings.warn(f"Ignoring invalid ATP_CACHE_MAX_MB={value!r}; using {default:g} MB")
+        return default
+
+CACHE_MAX_MB = cache_max_mb()
+
+def prune_cache(cache_dir=CACHE_DIR, max_mb: float = CACHE_MAX_MB):
+    """Delete the least recently used cache files until the cache fits in max_mb."""
+    if not cache_dir or not os.path.isdir(cache_dir):
+        return
+    files = []
+    for root, _, names in os.walk(cache_dir):
+        for name in names:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                # Pruned by another session meanwhile
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= max_mb * 1024 * 1024:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
 
-def process_audio(file_path: str, start_time: str, end_time: str, whisper_model="base"):
+# Diarization results, keyed by a hash of the decoded audio range.
+DIARIZATION_CACHE_DIR = CACHE_DIR
+
+def cached_diarization(samples: np.ndarray, sample_rate: int, **batch_sizes):
     """
-    Orchestrates the entire processing:
-    1. Trims the audio to the given time range.
-    2. Runs diarization to find speaker segments.
-    3. For each speaker segment, re-trims & transcribes with Whisper.
+    Run diarization on decoded samples, reusing the result stored on disk for
+    identical audio (same file and time range), so reruns skip pyannote.
+    batch_sizes (embedding_batch_size, segmentation_batch_size) go to run_diarization.
     """
-    temp_dir = tempfile.mkdtemp()
-    trimmed_path = os.path.join(temp_dir, "trimmed_audio.wav")
+    audio = {"waveform": torch.from_numpy(samples).unsqueeze(0), "sample_rate": sample_rate}
+    if not DIARIZATION_CACHE_DIR:
+        return run_diarization(audio, **batch_sizes)
+    key = hashlib.blake2b(samples.tobytes(), digest_size=16).hexdigest()
+    cache_file = os.path.join(DIARIZATION_CACHE_DIR, f"{key}.json")
+    try:
+        # Mark as recently used so prune_cache keeps it
+        os.utime(cache_file)
+        with open(cache_file) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        # Not cached, or pruned by another session since
+        pass
+    segments = run_diarization(audio, **batch_sizes)
+    # Empty results usually mean diarization failed; don't persist those.
+    if segments:
+        os.makedirs(DIARIZATION_CACHE_DIR, exist_ok=True)
+        with open(cache_file, "w") as f:
+            json.dump(segments, f)
+    return segments
+
+# Transcripts of individual clips, keyed by a hash of their samples and the model.
+TRANSCRIPT_CACHE_DIR = os.path.join(CACHE_DIR, "whisper") if CACHE_DIR else None
 
-    # Trim the main file to user’s requested time range
-    trimmed_file = trim_audio(file_path, start_time, end_time, trimmed_path)
-    if not trimmed_file:
-        return []
+@st.cache_resource
+def get_transcriber(model_name: str) -> WhisperTranscriber:
+    """One WhisperTranscriber per model, kept across Streamlit reruns."""
+    return WhisperTranscriber(model_name=model_name, cache_dir=TRANSCRIPT_CACHE_DIR)
+
+def process_audio_stream(
+    file_path: str, start_time: str, end_time: str, whisper_model="base",
+    embedding_batch_size: int = 8, segmentation_batch_size: int = 8
+) -> Iterator[List[dict]]:
+    """
+    Orchestrates the entire processing:
+    1. Decodes the given time range into memory (one ffmpeg call, no temp files).
+    2. Runs diarization on the in-memory waveform to find speaker segments
+       (skipped for single-speaker audio; cached for repeated audio).
+    3. Slices each speaker segment out of the decoded range & transcribes it with Whisper.
+    Yields the transcribed segments of each batch as soon as it is decoded.
+    """
+    samples = load_audio(file_path, start_time, end_time)
+    if samples is None:
+        return
+    sample_rate = 16000
+    prune_cache()
 
-    # Diarize
-    diarization_segments = run_diarization(trimmed_file)
+    # Diarize (cached by audio content), unless a cheap VAD pass shows there's
+    # only one speech region or too little speech to be worth it
+    diarization_segments = single_speaker_segments(samples, sample_rate)
+    if diarization_segments is None:
+        diarization_segments = cached_diarization(
+            samples, sample_rate,
+            embedding_batch_size=embedding_batch_size,
+            segmentation_batch_size=segmentation_batch_size
+        )
 
     # Transcribe
-    transcriber = WhisperTranscriber(model_name=whisper_model)
-    transcriptions = []
-    for i, segment in enumerate(diarization_segments):
-        seg_start = seconds_to_hms(segment["start"])
-        seg_end   = seconds_to_hms(segment["end"])
-        # Create a new trimmed segment
-        segment_path = os.path.join(temp_dir, f"segment_{i}.wav")
-        segment_file = trim_audio(trimmed_file, seg_start, seg_end, segment_path)
-        if segment_file:
-            text = transcriber.transcribe(segment_file)
-            transcriptions.append({
+    transcriber = get_transcriber(whisper_model)
+    segments = []
+    clips = []
+    for segment in diarization_segments:
+        clip = samples[int(segment["start"] * sample_rate):int(segment["end"] * sample_rate)]
+        if len(clip) == 0:
+            continue
+        segments.append(segment)
+        clips.append(clip)
+    # Segments are transcribed in batches rather than one Whisper call each,
+    # and each batch is handed back before the next one starts.
+    for b in range(0, len(clips), transcriber.batch_size):
+        texts = transcriber.transcribe_batch(clips[b:b + transcriber.batch_size])
+        yield [
+            {
                 "speaker": segment["speaker"],
                 "text": text,
                 "start": segment["start"],
                 "end": segment["end"]
-            })
-            os.remove(segment_file)
-    os.remove(trimmed_file)
-    return transcriptions
+            }
+            for segment, text in zip(segments[b:], texts)
+        ]
+
+def process_audio(file_path: str, start_time: str, end_time: str, whisper_model="base", **batch_sizes) -> List[dict]:
+    """Run process_audio_stream to completion and return all transcribed segments."""
+    return [
+        segment
+        for batch in process_audio_stream(file_path, start_time, end_time, whisper_model, **batch_sizes)
+        for segment in batch
+    ]
 
 def main():
     display_header()
     
     # Sidebar config
     st.sidebar.header("Configuration")
-    whisper_model = st.sidebar.selectbox("Whisper Model", get_whisper_models(), index=1)
+    whisper_model = st.sidebar.selectbox("Whisper Model", WHISPER_MODELS, index=1)
+    with st.sidebar.expander("Advanced"):
+        batch_sizes = {
+            "embedding_batch_size": st.select_slider(
+                "Diarization embedding batch size", options=[1, 2, 4, 8, 16, 32], value=8,
+                help="Lower this if diarization is slow on a GPU with little memory."
+            ),
+            "segmentation_batch_size": st.select_slider(
+                "Diarization segmentation batch size", options=[1, 2, 4, 8, 16, 32], value=8
+            ),
+        }
 
     # Tabs for either file upload or YouTube
     tab1, tab2 = st.tabs(["📁 Upload Audio", "🎥 YouTube URL"])
@@ -207,17 +315,11 @@ def main():
                 # Process
                 with st.spinner("Processing audio..."):
                     temp_path = create_temp_file(uploaded_file)
-                    transcriptions = process_audio(temp_path, start_time, end_time, whisper_model)
-                    display_transcription(transcriptions)
+                    transcriptions = display_transcription(process_audio_stream(temp_path, start_time, end_time, whisper_model, **batch_sizes))
                     if transcriptions:
-                        # Make a text for download
-                        download_text = "\n\n".join([
-                            f"{t['speaker']} ({t['start']:.2f}s - {t['end']:.2f}s): {t['text']}"
-                            for t in transcriptions
-                        ])
                         st.download_button(
                             label="Download Transcription",
-                            data=download_text,
+                            data=transcription_text(transcriptions),
                             file_name=f"transcription_{int(time.time())}.txt",
                             mime="text/plain"
                         )
@@ -252,16 +354,11 @@ def main():
                     output_file = os.path.join(temp_dir, "youtube_audio.wav")
                     audio_file = download_youtube_audio(youtube_url, output_file)
                     if audio_file:
-                        transcriptions = process_audio(audio_file, start_time, end_time, whisper_model)
-                        display_transcription(transcriptions)
+                        transcriptions = display_transcription(process_audio_stream(audio_file, start_time, end_time, whisper_model, **batch_sizes))
                         if transcriptions:
-                            download_text = "\n\n".join([
-                                f"{t['speaker']} ({t['start']:.2f}s - {t['end']:.2f}s): {t['text']}"
-                                for t in transcriptions
-                            ])
                             st.download_button(
                                 label="Download Transcription",
-                                data=download_text,
+                                data=transcription_text(transcriptions),
                                 file_name=f"youtube_transcription_{int(time.time())}.txt",
                                 mime="text/plain"
                             )
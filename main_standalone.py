@@ -1,56 +1,71 @@
 import os
 import subprocess
-from typing import List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Iterable, Iterator, List, Dict, Any
+import torch
 import whisper  # Import Whisper for transcription
 
+@lru_cache(maxsize=4)
+def load_whisper_model(model_name: str, backend: str = "openai-whisper"):
+    """
+    Load a Whisper model once; later calls reuse the same weights.
+    backend is "openai-whisper", or "faster-whisper" (optional dependency) for
+    CTranslate2 with int8 weights.
+    """
+    if backend == "openai-whisper":
+        return whisper.load_model(model_name)
+    if backend == "faster-whisper":
+        from faster_whisper import WhisperModel
+
+        cuda = torch.cuda.is_available()
+        return WhisperModel(
+            model_name,
+            device="cuda" if cuda else "cpu",
+            compute_type="int8_float16" if cuda else "int8"
+        )
+    raise ValueError(f"Unknown transcription backend: {backend}")
+
+def transcribe_file(model, audio_file: str, backend: str = "openai-whisper") -> str:
+    """Transcribe one audio file with a model from load_whisper_model(..., backend)."""
+    if backend == "faster-whisper":
+        # Greedy decoding; segments are generated lazily, so join consumes them.
+        segments, _ = model.transcribe(audio_file, beam_size=1)
+        return " ".join(segment.text.strip() for segment in segments).strip()
+    with torch.inference_mode():
+        return model.transcribe(audio_file)["text"].strip()
+
 def download_and_trim_audio(
     url: str, output_path: str, start_time: str = "00:00:00", end_time: str = None, file_id: int = None
 ) -> str:
     if not os.path.exists(output_path):
         os.makedirs(output_path)
 
-    # Use file_id to name the initial downloaded file and the trimmed file
-    raw_audio_file = os.path.join(output_path, f"{file_id}_raw.wav" if file_id else "raw_audio.wav")
+    # Use file_id to name the trimmed file
     trimmed_audio_file = os.path.join(output_path, f"{file_id}.wav" if file_id else "trimmed_audio.wav")
 
-    # Download the full audio
+    # Download only the requested section; yt-dlp fetches and cuts it in one pass,
+    # so there is no full-length raw file to write, re-read and delete.
     command = [
         "yt-dlp",
         "-f", "bestaudio",
         "--extract-audio",
         "--audio-format", "wav",
-        "-o", raw_audio_file,
+        "--download-sections", f"*{start_time}-{end_time or 'inf'}",
+        "--force-keyframes-at-cuts",
+        "-o", os.path.splitext(trimmed_audio_file)[0] + ".%(ext)s",
         url,
     ]
     
-    print(f"Downloading audio from {url}")
+    print(f"Downloading audio from {url} ({start_time} to {end_time})")
     try:
-        subprocess.run(command, check=True, text=True)
+        # Several downloads run at once (see main), so keep yt-dlp's progress output
+        # off the console and only report its stderr when it fails.
+        subprocess.run(command, check=True, text=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
     except subprocess.CalledProcessError as e:
-        print(f"Error downloading audio: {e}")
+        print(f"Error downloading audio: {e}\n{e.stderr}")
         raise
 
-    # Trim the audio using ffmpeg
-    ffmpeg_command = [
-        "ffmpeg",
-        "-i", raw_audio_file,
-        "-ss", start_time,
-        "-to", end_time,
-        "-c", "copy",
-        trimmed_audio_file,
-    ]
-    
-    print(f"Trimming audio from {start_time} to {end_time}")
-    try:
-        subprocess.run(ffmpeg_command, check=True, text=True)
-    except subprocess.CalledProcessError as e:
-        print(f"Error trimming audio: {e}")
-        raise
-
-    # Remove the raw audio file to save space
-    if os.path.exists(raw_audio_file):
-        os.remove(raw_audio_file)
-
     if os.path.exists(trimmed_audio_file):
         print(f"Trimmed audio saved to: {trimmed_audio_file}")
         return trimmed_audio_file
@@ -59,19 +74,18 @@ def download_and_trim_audio(
 
 
 
-def transcribe_audio_files(audio_files: List[str], output_dir: str) -> List[str]:
+def transcribe_audio_files(audio_files: Iterable[str], output_dir: str, backend: str = "openai-whisper") -> List[str]:
     file_and_transcripts = []
     
     # Load the Whisper model
-    model = whisper.load_model("base")  # You can choose 'tiny', 'base', 'small', 'medium', 'large'
+    model = load_whisper_model("base", backend)  # You can choose 'tiny', 'base', 'small', 'medium', 'large'
     
     for audio_file in audio_files:
         if os.path.exists(audio_file):
             try:
                 # Transcribe the audio file using Whisper
                 print(f"Transcribing {audio_file}...")
-                result = model.transcribe(audio_file)
-                transcript = result["text"].strip()
+                transcript = transcribe_file(model, audio_file, backend)
                 print(f"Transcribed {audio_file}: {transcript}")
             except Exception as e:
                 print(f"Error transcribing {audio_file}: {e}")
@@ -113,11 +127,12 @@ def main():
     ]
 
     audio_output_dir = "extracted_audio"
+    backend = "openai-whisper"  # or "faster-whisper" (optional dependency: pip install faster-whisper)
     transcription_output_dir = "transcriptions"
     os.makedirs(audio_output_dir, exist_ok=True)
     os.makedirs(transcription_output_dir, exist_ok=True)
 
-    audio_files = []
+    tasks = []
     for info in url_info_list:
         url = info['url']
         time_ranges = info.get('time_ranges', [])
@@ -127,15 +142,24 @@ def main():
             end_time = time_range.get('end_time', None)
             print(f"end_time: {end_time}")
             file_id = time_range.get('id', None)
-            # Download the audio from the YouTube video in the specified time range
+            tasks.append((url, start_time, end_time, file_id))
+
+    def downloaded_files(futures) -> Iterator[str]:
+        # Yield files in task order as their downloads finish, so transcribing
+        # one overlaps downloading the next.
+        for url, future in futures:
             try:
-                audio_file = download_and_trim_audio(url, audio_output_dir, start_time, end_time, file_id)
-                audio_files.append(audio_file)
+                yield future.result()
             except Exception as e:
                 print(f"Error downloading audio from {url}: {e}")
 
-    # Transcribe the audio files
-    file_and_transcripts = transcribe_audio_files(audio_files, transcription_output_dir)
+    # Download the audio sections in parallel and transcribe them as they arrive
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [
+            (url, executor.submit(download_and_trim_audio, url, audio_output_dir, start_time, end_time, file_id))
+            for url, start_time, end_time, file_id in tasks
+        ]
+        file_and_transcripts = transcribe_audio_files(downloaded_files(futures), transcription_output_dir, backend)
 
     # Create the transcription file
     output_file = os.path.join(transcription_output_dir, "list.txt")